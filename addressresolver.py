@@ -0,0 +1,190 @@
+import logging
+import re
+import threading
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+from gazetteer import ADMIN1, ADMIN2, ADMIN3, ADMIN4, get_gazetteer
+
+logger = logging.getLogger(__name__)
+
+# From the top of the hierarchy down
+ADMIN_LEVELS = [ADMIN1, ADMIN2, ADMIN3, ADMIN4]
+# fuzz.ratio of the processed names, 0-100, below which a name is not matched
+SCORE_CUTOFF = 85
+
+# "Kota" is kept, the gazetteer has both e.g. "Bogor" (the kabupaten) and "Kota Bogor"
+_PREFIX = re.compile(
+    r"^(provinsi|prov|kabupaten|kab|kecamatan|kec|kelurahan|kel|desa|ds)(\.\s*|\s+)"
+)
+_SEPARATORS = re.compile(r"[^a-z0-9]+")
+
+
+def process_name(name):
+    """Lowercase a name and drop its admin prefix and punctuation, for matching."""
+    name = _PREFIX.sub("", str(name).strip().lower())
+    return _SEPARATORS.sub(" ", name).strip()
+
+
+def _contains(sorted_positions, position):
+    index = np.searchsorted(sorted_positions, position)
+    return index < len(sorted_positions) and sorted_positions[index] == position
+
+
+class _Choices:
+    """The distinct names of one admin level, with their processed form."""
+
+    def __init__(self, column):
+        self.names = pd.unique(column.dropna())
+        self.processed = [process_name(name) for name in self.names]
+        # the first name of every processed form
+        self.exact = {}
+        for position, processed in enumerate(self.processed):
+            self.exact.setdefault(processed, position)
+        self.positions = {name: position for position, name in enumerate(self.names)}
+
+
+class AddressResolver:
+    """Fuzzy matching of address names to the names of the gazetteer.
+
+    Names are first matched exactly after processing (so "Kab. Banyuwangi"
+    matches "Banyuwangi"), and otherwise to the most similar name of the admin
+    level scoring at least `score_cutoff`. With a scope of higher admin levels,
+    e.g. the province and city of a kecamatan, only the names under the
+    resolved scope are candidates, falling back to all names if none of them
+    match. Resolved names are memoized.
+    """
+
+    def __init__(self, gazetteer, score_cutoff=SCORE_CUTOFF):
+        self.score_cutoff = score_cutoff
+        self._choices = {level: _Choices(gazetteer.df[level]) for level in ADMIN_LEVELS}
+        # (parent level, level) -> {parent name: positions of its children's names}
+        self._children = {}
+        for depth, parent in enumerate(ADMIN_LEVELS):
+            for level in ADMIN_LEVELS[depth + 1 :]:
+                pairs = gazetteer.df[[parent, level]].dropna().drop_duplicates()
+                positions = pairs[level].map(self._choices[level].positions)
+                self._children[parent, level] = {
+                    name: np.sort(group.to_numpy())
+                    for name, group in positions.groupby(pairs[parent], sort=False)
+                }
+        self._cache = {}
+
+    def resolve(self, name, level, scope=None):
+        """Return the gazetteer name of `level` that matches `name`, or None.
+
+        `scope` maps higher admin levels to names, e.g. {ADMIN1: "Jawa Timur"}.
+        """
+        if not name:
+            return None
+        return self.resolve_many([name], level, [scope])[0]
+
+    def resolve_many(self, names, level, scopes=None):
+        """resolve of many names at once, scoring them in one cdist per scope."""
+        if scopes is None:
+            scopes = [None] * len(names)
+        results = [None] * len(names)
+        # the queries to score by scope, then by processed name
+        pending = {}
+        parents = {}
+        for index, (name, scope) in enumerate(zip(names, scopes)):
+            if not isinstance(name, str) or not name:
+                continue
+            parent = parents[index] = self._resolve_scope(level, scope)
+            query = process_name(name)
+            key = (level, query, parent)
+            if key in self._cache:
+                results[index] = self._cache[key]
+            else:
+                pending.setdefault(parent, {}).setdefault(query, []).append(index)
+
+        unmatched = {}
+        for parent, queries in pending.items():
+            matches = self._match(level, list(queries), parent)
+            for (query, indexes), match in zip(queries.items(), matches):
+                if match is None and parent is not None:
+                    unmatched.setdefault(query, []).extend(indexes)
+                    continue
+                self._cache[level, query, parent] = match
+                for index in indexes:
+                    results[index] = match
+
+        # nothing in scope, e.g. the city is wrong: try all the names
+        if unmatched:
+            matches = self._match(level, list(unmatched), None)
+            for (query, indexes), match in zip(unmatched.items(), matches):
+                for index in indexes:
+                    self._cache[level, query, parents[index]] = match
+                    results[index] = match
+        return results
+
+    def _resolve_scope(self, level, scope):
+        """Resolve the scope, top down, into the deepest (parent level, name) or None."""
+        parent = None
+        if not scope:
+            return parent
+        for parent_level in ADMIN_LEVELS[: ADMIN_LEVELS.index(level)]:
+            parent_name = scope.get(parent_level)
+            if not parent_name:
+                continue
+            resolved = self.resolve(
+                parent_name, parent_level, {} if parent is None else dict([parent])
+            )
+            if resolved is not None:
+                parent = (parent_level, resolved)
+        return parent
+
+    def _match(self, level, queries, parent):
+        choices = self._choices[level]
+        if parent is None:
+            candidates = None
+        else:
+            candidates = self._children[parent[0], level].get(parent[1])
+            if candidates is None or len(candidates) == 0:
+                return [None] * len(queries)
+
+        matches = [None] * len(queries)
+        fuzzy = []
+        for index, query in enumerate(queries):
+            position = choices.exact.get(query)
+            if position is not None and (
+                candidates is None or _contains(candidates, position)
+            ):
+                matches[index] = choices.names[position]
+            elif query:
+                fuzzy.append(index)
+        if not fuzzy:
+            return matches
+
+        if candidates is None:
+            candidate_names = choices.processed
+        else:
+            candidate_names = [choices.processed[position] for position in candidates]
+        scores = process.cdist(
+            [queries[index] for index in fuzzy],
+            candidate_names,
+            scorer=fuzz.ratio,
+            score_cutoff=self.score_cutoff,
+            workers=-1,
+        )
+        best = scores.argmax(axis=1)
+        for row, index in enumerate(fuzzy):
+            if scores[row, best[row]] > 0:
+                position = best[row] if candidates is None else candidates[best[row]]
+                matches[index] = choices.names[position]
+                logger.debug(f"Fuzzy matched {queries[index]} to {matches[index]}")
+        return matches
+
+
+_address_resolver = None
+_address_resolver_lock = threading.Lock()
+
+
+def get_address_resolver():
+    """Return the process-wide AddressResolver of the gazetteer, building it on first use."""
+    global _address_resolver
+    if _address_resolver is None:
+        with _address_resolver_lock:
+            if _address_resolver is None:
+                _address_resolver = AddressResolver(get_gazetteer())
+    return _address_resolver
@@ -0,0 +1,136 @@
+# The address lookups of a Contact, against the process-wide gazetteer, district
+# index and address resolver. They live here so that a Contact is a plain record
+# of the extracted fields.
+import logging
+from addressresolver import get_address_resolver
+from contact import Category
+from districts import get_district_index
+from gazetteer import ADMIN1, ADMIN2, ADMIN3, ADMIN4, get_gazetteer
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_COLUMNS = {
+    Category.PROVINCE: ADMIN1,
+    Category.CITY: ADMIN2,
+    Category.KECAMATAN: ADMIN3,
+    Category.DESA: ADMIN4,
+}
+
+
+def find_level(kota_kab_result):
+    """A helper function to determine the level of a district (kota or kabupaten) based on the provided city name"""
+
+    if kota_kab_result is None:
+        return None
+
+    level = get_district_index().find_level(kota_kab_result)
+    if level is not None:
+        logger.info(f"Match found: {kota_kab_result} is a {level}")
+    else:
+        logger.warning(f"City {kota_kab_result} not found in the dataset.")
+    return level
+
+
+def validate(addr_input, category: Category, fuzzy=False, scope=None):
+    """Validate an address input based on the specified category.
+
+    Args:
+        addr_input (str): The address input to validate.
+        category (Category): The category of the address input.
+        fuzzy (bool): Whether to match misspelled names as well.
+        scope (dict): The names of the higher admin levels to search a
+            misspelled name in first, e.g. {ADMIN1: province, ADMIN2: city}.
+
+    Raises:
+        ValueError: If an invalid category is provided.
+
+    Returns:
+        tuple: A tuple containing a boolean indicating whether the address input is valid for the given category and a DataFrame of the filtered results.
+    """
+    if category in CATEGORY_COLUMNS:
+        column = CATEGORY_COLUMNS[category]
+        filtered_df = get_gazetteer().lookup(column, addr_input)
+        if filtered_df is None and fuzzy:
+            resolved = get_address_resolver().resolve(addr_input, column, scope)
+            if resolved is not None:
+                logger.info(f"Resolved {addr_input} to the {category.value} {resolved}")
+                filtered_df = get_gazetteer().lookup(column, resolved)
+        if filtered_df is not None:
+            logger.debug(f"{addr_input} is a {category}")
+            return (True, filtered_df)
+        else:
+            return (False, None)
+    else:
+        raise ValueError(f"Invalid category provided: {category}.")
+
+
+def init_level(contact):
+    """Set the level of a contact from its kecamatan, or move the kecamatan to the
+    field of the category it turns out to be."""
+    if contact.kecamatan == "" or contact.kecamatan == None:
+        logger.warning("contact.kecamatan is empty or None")
+        # TODO: proceed with the logic as explained by Audris
+        return
+    kecamatan_input = contact.kecamatan
+    # misspelled names are searched for within the contact's province and city first
+    scope = {ADMIN1: contact.province, ADMIN2: contact.city}
+
+    kota_kab_result = ""
+
+    try:
+        # check if the kecamatan_input is actually a kecamatan
+        isValid, district_df = validate(
+            addr_input=kecamatan_input, category=Category.KECAMATAN
+        )
+    except (TypeError, AttributeError, ValueError) as e:
+        if isinstance(e, TypeError):
+            print("TypeError occurred:", e)
+        elif isinstance(e, AttributeError):
+            print("AttributeError occurred:", e)
+        elif isinstance(e, ValueError):  # if category is invalid
+            print("ValueError occured:", e)
+
+    # if district_df is empty, we need to check if it's the other category
+    if isValid:
+        # find level
+        kota_kab_result = district_df.iloc[0][ADMIN2]
+        logger.info(f"Mencari level dari kota/kab {str(kota_kab_result)}")
+        level = find_level(kota_kab_result)
+    else:
+        level = None
+        print("No match found in kecamatan. Checking other categories.")
+        # exact names first, so that e.g. a desa is not taken for a similar kecamatan
+        categories = [Category.DESA, Category.CITY, Category.PROVINCE]
+        attempts = [(category, False) for category in categories] + [
+            (category, True) for category in [Category.KECAMATAN] + categories
+        ]
+        for category, fuzzy in attempts:
+            is_valid, district_df = validate(
+                addr_input=kecamatan_input, category=category, fuzzy=fuzzy, scope=scope
+            )
+            if is_valid:
+                print(f"Found match in category: {category}")
+                # the gazetteer's spelling of a fuzzy match
+                name = (
+                    district_df.iloc[0][CATEGORY_COLUMNS[category]]
+                    if fuzzy
+                    else kecamatan_input
+                )
+                if category == Category.PROVINCE:
+                    contact.province = name
+                elif category == Category.CITY:
+                    contact.city = name
+                elif category == Category.KECAMATAN:
+                    contact.kecamatan = name
+                    level = find_level(district_df.iloc[0][ADMIN2])
+                elif category == Category.DESA:
+                    contact.address = name
+
+                # Debug
+                logger.debug(f"Change field {category} to {name}")
+                break
+        else:
+            logger.warning("No match found in any category.")
+            return
+
+    contact.level = level
@@ -0,0 +1,146 @@
+import re
+from functools import lru_cache
+
+PHONE_PLACEHOLDER = "08123456789"
+NAME_PLACEHOLDER = "Tian"
+
+PHONE_REGEX = re.compile(r"(?<!\d)(?:\+62|08)\d{9,}\b")
+
+_END = None  # trie key marking the end of a name part
+
+
+def _is_word(char):
+    # same definition of a word character as \w in re
+    return char.isalnum() or char == "_"
+
+
+class _NameTrie:
+    """Matches name parts like \\b(part1|part2|...|full name)\\b with re.IGNORECASE.
+
+    The parts are compiled into a character trie and then a single regex, e.g.
+    the parts "an", "anna" and "budi" become \\b(?:an(?:na)?|budi)\\b, which
+    finds the positions where a name matches in one pass over the text without
+    trying every alternative at every position. The trie prefers the longest
+    part, while the alternation takes the first alternative that matches (which
+    differs when one part is a prefix of another ending in punctuation, e.g.
+    "a" and "a."), so the alternation itself is run at the positions found.
+    """
+
+    def __init__(self, names):
+        self.root = {}
+        alternatives = []
+        full_names = []
+        for parts in names:
+            for part in parts:
+                node = self.root
+                for char in part:
+                    node = node.setdefault(char, {})
+                node[_END] = True
+            alternatives.extend(map(re.escape, parts))
+            full_name = r"\s+".join(map(re.escape, parts))
+            alternatives.append(full_name)
+            if len(parts) > 1:
+                full_names.append(full_name)
+        self.regex = re.compile(
+            r"\b(?:" + "|".join([self._pattern(self.root)] + full_names) + r")\b",
+            re.IGNORECASE,
+        )
+        self.alternation = re.compile(
+            r"\b(" + "|".join(alternatives) + r")\b", re.IGNORECASE
+        )
+
+    @classmethod
+    def _pattern(cls, node):
+        branches = [
+            re.escape(char) + cls._pattern(child)
+            for char, child in node.items()
+            if char is not _END
+        ]
+        if not branches:
+            return ""
+        if len(branches) == 1 and _END not in node:
+            return branches[0]
+        pattern = "(?:" + "|".join(branches) + ")"
+        if _END in node:
+            # a part may also end here
+            pattern += "?"
+        return pattern
+
+    def sub(self, placeholder, text):
+        pieces = []
+        position = 0
+        while True:
+            found = self.regex.search(text, position)
+            if found is None:
+                break
+            match = self.alternation.match(text, found.start())
+            pieces.append(text[position : match.start()])
+            pieces.append(placeholder)
+            position = match.end()
+        pieces.append(text[position:])
+        return "".join(pieces)
+
+
+@lru_cache(maxsize=1024)
+def _compile_names(names):
+    """Build (and cache) the matchers for a tuple of names."""
+    name_parts = []  # the parts of every name
+    parentheses_patterns = []
+    for name in names:
+        parts = name.replace("(", "").replace(")", "").split()
+        if not parts:
+            continue
+        name_parts.append(parts)
+        # "Full Name (nickname)" is not anchored at a word boundary, it can only
+        # survive the single-part pass for one-part names (e.g. "san(x)" for "an")
+        # or when the last part starts or ends with a non-word character (e.g. "S.")
+        last_part = parts[-1]
+        if len(parts) == 1 or not _is_word(last_part[0]) or not _is_word(last_part[-1]):
+            parentheses_patterns.append(
+                r"(" + r"\s+".join(map(re.escape, parts)) + r")\s*\(([^)]+)\)"
+            )
+
+    trie = _NameTrie(name_parts) if name_parts else None
+    parentheses_regex = None
+    if parentheses_patterns:
+        parentheses_regex = re.compile("|".join(parentheses_patterns), re.IGNORECASE)
+    return trie, parentheses_regex
+
+
+class Anonymizer:
+    """Replaces names and phone numbers in conversations with placeholders.
+
+    All names given to anonymize (e.g. the contact's and the agent's) are matched
+    in a single pass with a trie of their parts, and the phone numbers in a
+    second pass with a precompiled regex. The tries are cached per set of names.
+    """
+
+    def __init__(
+        self, name_placeholder=NAME_PLACEHOLDER, phone_placeholder=PHONE_PLACEHOLDER
+    ):
+        self.name_placeholder = name_placeholder
+        self.phone_placeholder = phone_placeholder
+
+    def anonymize(self, conversation, names):
+        """Anonymize the names and phone numbers in the conversation.
+
+        Returns the anonymized conversation and the list of original phone numbers.
+        """
+        trie, parentheses_regex = _compile_names(tuple(names))
+        if trie is not None:
+            conversation = trie.sub(self.name_placeholder, conversation)
+        if parentheses_regex is not None:
+            conversation = parentheses_regex.sub(
+                lambda match: f"{self.name_placeholder} ({self.name_placeholder})",
+                conversation,
+            )
+
+        # Anonymize phone numbers
+        original_phone_numbers = []
+
+        def replace_phone(match):
+            original_phone_numbers.append(match.group(0))
+            return self.phone_placeholder
+
+        conversation = PHONE_REGEX.sub(replace_phone, conversation)
+        return conversation, original_phone_numbers
@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT = "/v1/chat/completions"
+# Limits of one batch, see https://platform.openai.com/docs/guides/batch
+MAX_BATCH_REQUESTS = 50000
+MAX_BATCH_BYTES = 200 * 1024 * 1024
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchError(Exception):
+    pass
+
+
+def write_batch_files(path, requests):
+    """Write (custom_id, body) requests to one or more JSONL batch input files.
+
+    A new file is started whenever a batch would exceed the request count or
+    size limit of the Batch API. Returns (path, custom ids) of the files, named
+    <path>, <path minus .jsonl>-2.jsonl, ...
+    """
+    base, extension = os.path.splitext(path)
+    files = []  # (path, custom ids)
+    file = None
+    count = size = 0
+    try:
+        for custom_id, body in requests:
+            line = (
+                json.dumps(
+                    {
+                        "custom_id": custom_id,
+                        "method": "POST",
+                        "url": ENDPOINT,
+                        "body": body,
+                    },
+                    ensure_ascii=False,
+                )
+                + "\n"
+            )
+            line_size = len(line.encode("utf-8"))
+            if file is None or (
+                count >= MAX_BATCH_REQUESTS or size + line_size > MAX_BATCH_BYTES
+            ):
+                if file is not None:
+                    file.close()
+                file_path = path if not files else f"{base}-{len(files) + 1}{extension}"
+                files.append((file_path, []))
+                file = open(file_path, "w", encoding="utf-8")
+                count = size = 0
+            file.write(line)
+            files[-1][1].append(custom_id)
+            count += 1
+            size += line_size
+    finally:
+        if file is not None:
+            file.close()
+    return files
+
+
+def submit_batch(client, path, completion_window="24h"):
+    """Upload a batch input file and create the batch, returns the batch."""
+    with open(path, "rb") as file:
+        input_file = client.files.create(file=file, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=ENDPOINT,
+        completion_window=completion_window,
+    )
+    logger.info(f"Submitted batch {batch.id} from {path}.")
+    return batch
+
+
+def wait_for_batch(client, batch_id, poll_interval=60, timeout=None):
+    """Poll the batch until it is completed, failed, expired or cancelled."""
+    start = time.monotonic()
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = getattr(batch, "request_counts", None)
+        if counts is not None:
+            logger.info(
+                f"Batch {batch_id} is {batch.status}: {counts.completed}/{counts.total} "
+                f"completed, {counts.failed} failed."
+            )
+        else:
+            logger.info(f"Batch {batch_id} is {batch.status}.")
+        if batch.status in FINAL_STATUSES:
+            return batch
+        if timeout is not None and time.monotonic() - start > timeout:
+            raise BatchError(f"Batch {batch_id} did not finish in {timeout} seconds.")
+        time.sleep(poll_interval)
+
+
+def read_batch_results(client, batch):
+    """Return {custom_id: content} of a finished batch.
+
+    Requests that failed (an error line or a non-200 response) are logged and
+    left out, as are the requests of a batch that expired before reaching them.
+    """
+    if batch.status != "completed" and batch.status != "expired":
+        raise BatchError(f"Batch {batch.id} ended with status {batch.status}.")
+
+    results = {}
+    if batch.output_file_id:
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            response = entry.get("response") or {}
+            if entry.get("error") or response.get("status_code") != 200:
+                logger.error(
+                    f"Batch request {entry['custom_id']} failed: "
+                    f"{entry.get('error') or response.get('body')}"
+                )
+                continue
+            results[entry["custom_id"]] = response["body"]["choices"][0]["message"][
+                "content"
+            ]
+
+    if batch.error_file_id:
+        for line in client.files.content(batch.error_file_id).text.splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                logger.error(
+                    f"Batch request {entry['custom_id']} failed: "
+                    f"{entry.get('error') or entry.get('response')}"
+                )
+    return results
+
+
+class BatchState:
+    """The batches that were submitted and whose results were not read yet.
+
+    They are saved to a JSON file right after submission, so that a run that is
+    stopped while polling (which can take up to 24 hours) resumes the batches
+    instead of submitting, and paying for, the requests again. Each batch is
+    saved with the keys of its requests by custom id, e.g. their cache keys.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.batches = {}  # batch id -> {custom id: key}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                self.batches = json.load(file)["batches"]
+
+    def add(self, batch_id, keys):
+        self.batches[batch_id] = keys
+        self._save()
+
+    def remove(self, batch_id):
+        del self.batches[batch_id]
+        self._save()
+
+    def _save(self):
+        if not self.batches:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        temp_file = f"{self.path}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as file:
+            json.dump({"batches": self.batches}, file)
+        os.replace(temp_file, self.path)
+
+
+def wait_for_batches(client, state, poll_interval=60, timeout=None, on_results=None):
+    """Wait for the batches of the state, returns {custom_id: content}.
+
+    on_results(results, keys) is called with the results of each batch as soon
+    as it is done, before it is removed from the state. A batch that failed is
+    logged and removed, one that did not finish in time is logged and kept to
+    be resumed by the next run.
+    """
+    results = {}
+    for batch_id, keys in list(state.batches.items()):
+        try:
+            batch = wait_for_batch(client, batch_id, poll_interval, timeout)
+        except BatchError as e:
+            logger.error(f"{e} It is kept in {state.path} to be resumed.")
+            continue
+        try:
+            batch_results = read_batch_results(client, batch)
+        except BatchError as e:
+            logger.error(str(e))
+            batch_results = {}
+        if on_results is not None:
+            on_results(batch_results, keys)
+        results.update(batch_results)
+        state.remove(batch_id)
+    return results
+
+
+def run_batch(
+    client,
+    requests,
+    path,
+    state,
+    keys=None,
+    poll_interval=60,
+    timeout=None,
+    on_results=None,
+):
+    """Write, submit and wait for the requests, returns {custom_id: content}.
+
+    All batch files are submitted and saved to the state before waiting, so
+    they are processed in parallel by the Batch API. keys maps the custom ids
+    to the keys saved with them, by default the custom ids themselves. See
+    wait_for_batches for on_results.
+    """
+    keys = keys or {}
+    for batch_path, custom_ids in write_batch_files(path, requests):
+        batch = submit_batch(client, batch_path)
+        state.add(
+            batch.id,
+            {custom_id: keys.get(custom_id, custom_id) for custom_id in custom_ids},
+        )
+    return wait_for_batches(client, state, poll_interval, timeout, on_results)
@@ -0,0 +1,399 @@
+# End-to-end benchmark of main.main without network or MySQL: the conversations
+# are synthetic, the names come from SQLite and the LLM is a fake with a
+# configurable latency. Example: python3 benchmark.py --files 200 --workers 8
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+import pandas as pd
+import chunking
+import extraction
+import gazetteer
+import main
+from benchmark_html import synthetic_samples
+from gazetteer import ADMIN1, ADMIN2, ADMIN3, ADMIN4, Gazetteer
+from ratelimiter import RateLimiter
+
+try:
+    import resource
+except ImportError:  # not available on Windows, the peak RSS is then not reported
+    resource = None
+
+CONTACT_NAME = "Budi Santoso"
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_conversation_folder(folder_path, files, messages, seed=0):
+    """Write `files` synthetic conversations of `messages` messages, returns the m13ids."""
+    os.makedirs(folder_path, exist_ok=True)
+    m13ids = []
+    samples = synthetic_samples(files, messages, seed=seed)
+    for index, sample in enumerate(samples):
+        letter = chr(ord("A") + index // 10000)
+        m13id = f"{letter} {index % 10000:04d}"
+        m13ids.append(m13id)
+        sample += f"\n{CONTACT_NAME}: <p>nomor saya 0812{index:08d}</p>"
+        with open(os.path.join(folder_path, f"{m13id}.txt"), "w") as f:
+            f.write(sample)
+    return m13ids
+
+
+def create_name_database(path, m13ids):
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE contacts (m13id TEXT PRIMARY KEY, displayname TEXT)"
+    )
+    connection.executemany(
+        "INSERT INTO contacts VALUES (?, ?)",
+        [(m13id, CONTACT_NAME) for m13id in m13ids],
+    )
+    connection.commit()
+    connection.close()
+
+
+class SQLiteDatabaseManager:
+    """Stand-in for DatabaseManager with the methods main.py uses, backed by SQLite."""
+
+    path = None  # set by the benchmark before the run
+
+    def __init__(self, db_config, pool_size=None):
+        self.connection = None
+
+    def connect(self):
+        self.connection = sqlite3.connect(self.path)
+
+    def disconnect(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def fetch_name_by_m13(self, m13id):
+        return pd.read_sql_query(
+            "SELECT displayname FROM contacts WHERE m13id = ?",
+            self.connection,
+            params=(m13id,),
+        )
+
+    def fetch_names_by_m13_list(self, m13ids, chunk_size=500):
+        names = {}
+        for start in range(0, len(m13ids), chunk_size):
+            chunk = m13ids[start : start + chunk_size]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = self.connection.execute(
+                f"SELECT m13id, displayname FROM contacts WHERE m13id IN ({placeholders})",
+                chunk,
+            )
+            names.update(rows)
+        return names
+
+
+class FakeLLMClient:
+    """Deterministic stand-in for the chat.completions, files and batches of
+    openai.OpenAI().
+
+    Every request sleeps latency +/- jitter seconds and returns an extraction with
+    all the keys the request asks for, using a kecamatan of the gazetteer so
+    that init_level does real lookups. The requests of a batch are answered when
+    it is created, and the batch is completed after `batch_polls` retrieves, or
+    failed if its id is in `failed_batches`.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.1, seed=0, kecamatan=None, batch_polls=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.kecamatan = kecamatan or [""]
+        self.batch_polls = batch_polls
+        self.failed_batches = set()
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._files = {}  # file id -> content
+        self._batches = {}  # batch id -> (batch, polls)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.files = SimpleNamespace(
+            create=self._create_file, content=self._file_content
+        )
+        self.batches = SimpleNamespace(
+            create=self._create_batch, retrieve=self._retrieve_batch
+        )
+
+    def create(self, model, messages, response_format=None):
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        time.sleep(max(delay, 0))
+
+        prompt = "".join(message["content"] for message in messages)
+        if "Here is the conversation" in prompt:  # prompt_summary
+            content = "Agen terakhir adalah Andi. COD bertanya tentang IAM."
+        else:
+            content = json.dumps(self._extraction(prompt, response_format))
+        usage = SimpleNamespace(
+            prompt_tokens=chunking.count_tokens(prompt, model),
+            completion_tokens=chunking.count_tokens(content, model),
+            prompt_tokens_details=SimpleNamespace(cached_tokens=0),
+        )
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=usage,
+        )
+
+    def _create_file(self, file, purpose):
+        return self._add_file(file.read().decode("utf-8"))
+
+    def _add_file(self, content):
+        file_id = f"file-{len(self._files) + 1}"
+        self._files[file_id] = content
+        return SimpleNamespace(id=file_id)
+
+    def _file_content(self, file_id):
+        return SimpleNamespace(text=self._files[file_id])
+
+    def _create_batch(self, input_file_id, endpoint, completion_window):
+        lines = []
+        for line in self._files[input_file_id].splitlines():
+            request = json.loads(line)
+            completion = self.create(**request["body"])
+            body = {
+                "choices": [
+                    {"message": {"content": completion.choices[0].message.content}}
+                ]
+            }
+            response = {"status_code": 200, "body": body}
+            lines.append(
+                json.dumps({"custom_id": request["custom_id"], "response": response})
+            )
+        batch = SimpleNamespace(
+            id=f"batch-{len(self._batches) + 1}",
+            status="validating",
+            output_file_id=self._add_file("\n".join(lines)).id,
+            error_file_id=None,
+            request_counts=SimpleNamespace(total=len(lines), completed=0, failed=0),
+        )
+        self._batches[batch.id] = (batch, 0)
+        return batch
+
+    def _retrieve_batch(self, batch_id):
+        batch, polls = self._batches[batch_id]
+        polls += 1
+        self._batches[batch_id] = (batch, polls)
+        if batch_id in self.failed_batches:
+            batch.status = "failed"
+        elif polls > self.batch_polls:
+            batch.status = "completed"
+            batch.request_counts.completed = batch.request_counts.total
+        else:
+            batch.status = "in_progress"
+        return batch
+
+    def _extraction(self, prompt, response_format):
+        summary = extraction.SUMMARY_KEY in prompt
+        if response_format is not None:  # lean
+            keys = response_format["json_schema"]["schema"]["required"]
+        else:
+            keys = extraction.extraction_keys(audit=True, summary=summary)
+        values = {
+            "name_result": main.NAME_PLACEHOLDER,
+            "handphone_result": main.PHONE_PLACEHOLDER,
+            "age_result": "30",
+            "gender_result": "Laki-laki",
+            "marriage_result": "Menikah",
+            "address_kecamatan_result": self.kecamatan[
+                len(prompt) % len(self.kecamatan)
+            ],
+            "comments": "COD asked about IAM.",
+            "comments_idn": "COD bertanya tentang IAM.",
+            extraction.SUMMARY_KEY: "Agen terakhir adalah Andi.",
+        }
+        result = {}
+        for key in keys:
+            if key.endswith("_confidence"):
+                result[key] = "90%"
+            elif key.endswith("_reasoning"):
+                result[key] = "Disebutkan dalam percakapan."
+            else:
+                result[key] = values.get(key, "")
+        return result
+
+
+def synthetic_gazetteer(districts_file="kota_kab.csv", kecamatan_per_city=5):
+    """A small gazetteer built from the kota/kabupaten list, for when the real
+    boundary workbook is not available."""
+    districts = pd.read_csv(districts_file)
+    rows = []
+    for district in districts.itertuples():
+        city = " ".join(district.name.split()[1:]).title()
+        for k in range(kecamatan_per_city):
+            rows.append(
+                {
+                    ADMIN1: f"Province {district.foreign}",
+                    ADMIN2: city,
+                    ADMIN3: f"{city} Kecamatan {k}",
+                    ADMIN4: f"{city} Desa {k}",
+                }
+            )
+    return Gazetteer(pd.DataFrame(rows))
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_benchmark(args):
+    work_dir = tempfile.mkdtemp(prefix="llm-summarization-benchmark-")
+    previous_dir = os.getcwd()
+    try:
+        folder_path = os.path.join(work_dir, "conversations")
+        m13ids = make_conversation_folder(
+            folder_path, args.files, args.messages, seed=args.seed
+        )
+        SQLiteDatabaseManager.path = os.path.join(work_dir, "names.sqlite")
+        create_name_database(SQLiteDatabaseManager.path, m13ids)
+
+        # main.py writes its dumps relative to the working directory, and Contact
+        # reads kota_kab.csv from it
+        os.chdir(work_dir)
+        os.makedirs("test-dump-2")
+        os.makedirs("test-output-dump")
+        shutil.copy(os.path.join(REPO_DIR, "kota_kab.csv"), "kota_kab.csv")
+
+        if args.synthetic_gazetteer or not (
+            os.path.exists(os.path.join(REPO_DIR, gazetteer.DATABASE_FILE))
+            or os.path.exists(os.path.join(REPO_DIR, gazetteer.DATABASE_CACHE_FILE))
+        ):
+            logging.info("Using a synthetic gazetteer")
+            gazetteer._gazetteer = synthetic_gazetteer()
+        else:
+            gazetteer._gazetteer = Gazetteer.load(
+                os.path.join(REPO_DIR, gazetteer.DATABASE_FILE),
+                os.path.join(REPO_DIR, gazetteer.DATABASE_CACHE_FILE),
+            )
+        kecamatan = gazetteer.get_gazetteer().df[ADMIN3].dropna().unique().tolist()
+
+        client = FakeLLMClient(args.latency, args.jitter, args.seed, kecamatan)
+        main.client_openai = client
+        main.DatabaseManager = SQLiteDatabaseManager
+        main.llm_cache = None
+        main.rate_limiter = RateLimiter(max_concurrency=args.workers)
+        main.lean_extraction = args.lean
+        main.summary_mode = args.summary_mode
+
+        results = []
+        for run in range(args.repeat):
+            start = time.perf_counter()
+            start_cpu = time.process_time()
+            main.main(
+                folder_path,
+                f"output-{run}.xlsx",
+                max_workers=args.workers,
+                excel_batch_size=args.excel_batch_size,
+                process_workers=args.process_workers,
+            )
+            elapsed = time.perf_counter() - start
+            results.append(
+                {
+                    "run": run,
+                    "files": args.files,
+                    "seconds": elapsed,
+                    "files_per_second": args.files / elapsed,
+                    "cpu_seconds": time.process_time() - start_cpu,
+                    "llm_requests": client.requests,
+                    "stages": main.stage_timer.summary(),
+                    "counters": dict(main.stage_timer.counters),
+                }
+            )
+            client.requests = 0
+            logging.info(
+                f"Run {run}: {args.files} files in {elapsed:.2f}s, "
+                f"{args.files / elapsed:.1f} files/s, "
+                f"{results[-1]['cpu_seconds']:.2f}s CPU\n"
+                f"{main.stage_timer.format_table()}"
+            )
+        return {
+            "config": vars(args),
+            "runs": results,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+    finally:
+        os.chdir(previous_dir)
+        if args.keep:
+            logging.info(f"Kept the benchmark files in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--files", type=int, default=100, help="Number of conversations"
+    )
+    parser.add_argument(
+        "--messages", type=int, default=40, help="Messages per conversation"
+    )
+    parser.add_argument("--workers", type=int, default=4, help="MAX_WORKERS of the run")
+    parser.add_argument(
+        "--latency", type=float, default=0.5, help="Fake LLM latency in seconds"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.1, help="Fake LLM latency jitter in seconds"
+    )
+    parser.add_argument(
+        "--process-workers",
+        type=int,
+        default=0,
+        help="Processes for the CPU stages (0 = in the worker threads)",
+    )
+    parser.add_argument("--excel-batch-size", type=int, default=50)
+    parser.add_argument("--lean", action="store_true", help="Use the lean prompt")
+    parser.add_argument(
+        "--summary-mode",
+        choices=["off", "separate", "combined"],
+        default="off",
+    )
+    parser.add_argument(
+        "--synthetic-gazetteer",
+        action="store_true",
+        help="Do not load the boundary workbook even if it exists",
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="Number of runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, help="Write the results as JSON")
+    parser.add_argument("--keep", action="store_true", help="Keep the work folder")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    if not args.verbose:
+        # the pipeline logs every file, keep only the warnings of the modules
+        for name in (
+            "main",
+            "utility",
+            "contact",
+            "addressservice",
+            "enrichment",
+            "runmanifest",
+            "ratelimiter",
+        ):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    report = run_benchmark(args)
+    if report["peak_rss_mb"] is not None:
+        logging.info(f"Peak RSS: {report['peak_rss_mb']:.1f} MB")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        logging.info(f"Wrote the results to {args.output}")
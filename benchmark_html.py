@@ -0,0 +1,113 @@
+import argparse
+import logging
+import os
+import random
+import time
+from bs4 import BeautifulSoup
+from htmltext import html_to_text, html_to_text_lxml, lxml
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+
+def beautifulsoup_get_text(markup):
+    # the implementation utility.clean_html_styling used before htmltext
+    return BeautifulSoup(markup, "html.parser").get_text()
+
+
+def load_samples(folder_path):
+    samples = []
+    for file_name in sorted(os.listdir(folder_path)):
+        if file_name.endswith(".txt"):
+            with open(os.path.join(folder_path, file_name), "r") as file:
+                samples.append(file.read())
+    return samples
+
+
+# Conversations shaped like the exported BodyHTML transcripts, for when no real
+# samples are at hand
+def synthetic_samples(count, messages_per_sample, seed=0):
+    rng = random.Random(seed)
+    words = ["saya", "ingin", "tahu", "tentang", "Isa", "Al-Masih", "terima", "kasih"]
+    bodies = [
+        "<p>{}</p>",
+        '<div dir="ltr">{}<br></div>',
+        "<p><b>{}</b> &amp; {}</p>",
+        '<p style="margin:0">{}&nbsp;{}</p><p><br></p>',
+        "{}",
+    ]
+    samples = []
+    for _ in range(count):
+        messages = []
+        for _ in range(messages_per_sample):
+            body = rng.choice(bodies)
+            text = " ".join(rng.choice(words) for _ in range(rng.randint(3, 30)))
+            speaker = rng.choice(["Budi", "AGENT"])
+            messages.append(f"{speaker}: " + body.format(text, text))
+        samples.append("\n".join(messages))
+    return samples
+
+
+def time_function(function, samples, repeat):
+    """Return the best total time of running function over all samples."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for sample in samples:
+            function(sample)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(args):
+    if args.folder:
+        samples = load_samples(args.folder)
+        logging.info(f"Loaded {len(samples)} samples from {args.folder}")
+    else:
+        samples = synthetic_samples(args.count, args.messages)
+        logging.info(f"Generated {len(samples)} synthetic samples")
+    total_mb = sum(len(sample) for sample in samples) / 1e6
+
+    expected = [beautifulsoup_get_text(sample) for sample in samples]
+    implementations = {
+        "BeautifulSoup": beautifulsoup_get_text,
+        "html_to_text": html_to_text,
+    }
+    if lxml is not None:
+        implementations["html_to_text_lxml"] = html_to_text_lxml
+    else:
+        logging.warning("lxml is not installed, skipping html_to_text_lxml")
+
+    baseline = None
+    for name, function in implementations.items():
+        identical = sum(
+            function(sample) == text for sample, text in zip(samples, expected)
+        )
+        elapsed = time_function(function, samples, args.repeat)
+        baseline = baseline or elapsed
+        logging.info(
+            f"{name:<18} {elapsed:8.3f}s  {len(samples) / elapsed:10.1f} files/s  "
+            f"{total_mb / elapsed:7.2f} MB/s  speedup {baseline / elapsed:5.2f}x  "
+            f"identical {identical}/{len(samples)}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--folder",
+        type=str,
+        help="Folder of exported conversations (.txt with BodyHTML), e.g. messages",
+    )
+    parser.add_argument(
+        "--count", type=int, default=500, help="Number of synthetic samples"
+    )
+    parser.add_argument(
+        "--messages", type=int, default=60, help="Messages per synthetic sample"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repetitions")
+    args = parser.parse_args()
+    main(args)
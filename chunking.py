@@ -0,0 +1,170 @@
+import logging
+import re
+import threading
+from extraction import TEXT_KEYS
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional, the token counts are estimated without it
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Conservative estimate used when tiktoken (or its encoding file) is not
+# available, Indonesian text averages a bit more than 3 characters per token
+CHARS_PER_TOKEN = 3
+
+_CONFIDENCE_NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+_CONFIDENCE_WORDS = {
+    "sangat tinggi": 0.95,
+    "very high": 0.95,
+    "tinggi": 0.8,
+    "high": 0.8,
+    "sedang": 0.5,
+    "medium": 0.5,
+    "rendah": 0.2,
+    "low": 0.2,
+}
+
+
+# the encoding of each model, None if it could not be loaded
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def _get_encoding(model):
+    if model not in _encodings:
+        # the first load may download the encoding file, only one thread tries
+        with _encodings_lock:
+            if model not in _encodings:
+                _encodings[model] = _load_encoding(model)
+    return _encodings[model]
+
+
+def _load_encoding(model):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # a model tiktoken does not know yet, all current chat models use o200k
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # the encoding file is downloaded on first use, which fails offline
+        logger.warning(f"Could not load the tiktoken encoding, estimating tokens: {e}")
+        return None
+
+
+def count_tokens(text, model):
+    """Count the tokens of text for the model, or estimate them without tiktoken."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _split_long_line(line, max_tokens, model):
+    encoding = _get_encoding(model)
+    if encoding is None:
+        size = max_tokens * CHARS_PER_TOKEN
+        return [line[i : i + size] for i in range(0, len(line), size)]
+    tokens = encoding.encode(line, disallowed_special=())
+    return [
+        encoding.decode(tokens[i : i + max_tokens])
+        for i in range(0, len(tokens), max_tokens)
+    ]
+
+
+def split_into_chunks(text, max_tokens, model):
+    """Split a conversation into chunks of at most max_tokens tokens.
+
+    Chunks end at line breaks, so messages are kept whole, unless a single line
+    is longer than max_tokens by itself.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for line in text.splitlines(keepends=True):
+        line_tokens = count_tokens(line, model)
+        if line_tokens > max_tokens:
+            pieces = _split_long_line(line, max_tokens, model)
+        else:
+            pieces = [line]
+        for piece in pieces:
+            piece_tokens = (
+                line_tokens if len(pieces) == 1 else count_tokens(piece, model)
+            )
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("".join(current))
+                current = []
+                current_tokens = 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def parse_confidence(confidence):
+    """Turn a confidence like "90%", "0.9" or "tinggi" into a number from 0 to 1."""
+    confidence = str(confidence).strip().lower()
+    match = _CONFIDENCE_NUMBER.search(confidence)
+    if match:
+        value = float(match.group(0).replace(",", "."))
+        if "%" in confidence or value > 1:
+            value /= 100
+        return min(value, 1.0)
+    for word, value in _CONFIDENCE_WORDS.items():
+        if word in confidence:
+            return value
+    return 0.0
+
+
+def _is_empty(value):
+    return value is None or str(value).strip() == ""
+
+
+def merge_extractions(partials):
+    """Merge the extraction results of the chunks of one conversation.
+
+    For every field, the non-empty result with the highest confidence wins (the
+    latest chunk on a tie, as later messages usually correct earlier ones), and
+    its reasoning and confidence are kept with it. The initial problem comes
+    from the first chunk that has one and the pressing problem from the last.
+    The comments, recommendation and extra info of all chunks are joined.
+    """
+    merged = {}
+    for partial in partials:
+        for key in partial:
+            merged.setdefault(key, "")
+
+    for key in list(merged):
+        values = [partial.get(key, "") for partial in partials]
+        non_empty = [value for value in values if not _is_empty(value)]
+        if key.endswith("_result"):
+            field = key[: -len("_result")]
+            best = None
+            for partial in partials:
+                if _is_empty(partial.get(key)):
+                    continue
+                confidence = parse_confidence(partial.get(f"{field}_confidence", ""))
+                if best is None or confidence >= best[0]:
+                    best = (confidence, partial)
+            if best is not None:
+                for suffix in ("_result", "_reasoning", "_confidence"):
+                    if field + suffix in merged:
+                        merged[field + suffix] = best[1].get(field + suffix, "")
+        elif key.endswith("_reasoning") or key.endswith("_confidence"):
+            continue  # set together with the result
+        elif key.startswith("persona_initial"):
+            merged[key] = non_empty[0] if non_empty else ""
+        elif key.startswith("persona_pressing"):
+            merged[key] = non_empty[-1] if non_empty else ""
+        elif key in TEXT_KEYS:
+            merged[key] = " ".join(
+                dict.fromkeys(str(value).strip() for value in non_empty)
+            )
+        else:
+            merged[key] = non_empty[0] if non_empty else ""
+    return merged
@@ -0,0 +1,69 @@
+import os
+import shutil
+import openpyxl
+import pytest
+import addressresolver
+import benchmark
+import districts
+import gazetteer
+import main
+from benchmark import REPO_DIR, synthetic_gazetteer
+from districts import DistrictIndex
+from gazetteer import ADMIN3
+from llmcache import LLMCache
+
+# the conversations of the run fixture
+FILES = 6
+
+
+@pytest.fixture(scope="session")
+def small_gazetteer():
+    """The synthetic gazetteer of benchmark.py: 5 kecamatan and desa per kota/kabupaten."""
+    return synthetic_gazetteer(os.path.join(REPO_DIR, districts.DISTRICTS_FILE))
+
+
+@pytest.fixture
+def address_db(small_gazetteer, monkeypatch):
+    """Use small_gazetteer, and the district index of the repository, as the
+    process-wide gazetteer, district index and address resolver."""
+    monkeypatch.setattr(gazetteer, "_gazetteer", small_gazetteer)
+    monkeypatch.setattr(
+        districts,
+        "_district_index",
+        DistrictIndex.from_csv(os.path.join(REPO_DIR, districts.DISTRICTS_FILE)),
+    )
+    monkeypatch.setattr(addressresolver, "_address_resolver", None)
+    return small_gazetteer
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    """A folder of conversations and main set up with fakes, as in benchmark.py."""
+    folder_path = str(tmp_path / "conversations")
+    m13ids = benchmark.make_conversation_folder(folder_path, FILES, 10)
+    database = str(tmp_path / "names.sqlite")
+    benchmark.create_name_database(database, m13ids)
+
+    # main.py writes its dumps relative to the working directory, and the
+    # district index reads kota_kab.csv from it
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("test-dump-2")
+    os.makedirs("test-output-dump")
+    shutil.copy(os.path.join(benchmark.REPO_DIR, "kota_kab.csv"), "kota_kab.csv")
+
+    monkeypatch.setattr(gazetteer, "_gazetteer", benchmark.synthetic_gazetteer())
+    kecamatan = gazetteer.get_gazetteer().df[ADMIN3].unique().tolist()
+    client = benchmark.FakeLLMClient(latency=0, jitter=0, kecamatan=kecamatan)
+    monkeypatch.setattr(benchmark.SQLiteDatabaseManager, "path", database)
+    monkeypatch.setattr(main, "DatabaseManager", benchmark.SQLiteDatabaseManager)
+    monkeypatch.setattr(main, "client_openai", client, raising=False)
+    monkeypatch.setattr(main, "llm_cache", LLMCache(str(tmp_path / "cache.sqlite")))
+    monkeypatch.setattr(main, "rate_limiter", None)
+    return folder_path, m13ids, client
+
+
+def read_rows(excel_file):
+    workbook = openpyxl.load_workbook(excel_file)
+    rows = [list(row) for row in workbook.active.iter_rows(values_only=True)]
+    workbook.close()
+    return rows
@@ -1,27 +1,109 @@
 import mysql.connector
+import mysql.connector.pooling
 import logging
+import os
+import threading
+import time
+from dotenv import load_dotenv
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_POOL_SIZE = 5
+POOL_TIMEOUT = 30  # seconds to wait for a free pooled connection
+
+_env_loaded = False
+_pools = {}
+_lock = threading.Lock()
+
+
+# .env is only read once per process
+def _load_env():
+    global _env_loaded
+    with _lock:
+        if not _env_loaded:
+            load_dotenv()
+            _env_loaded = True
+
+
+def load_db_config():
+    """Read the database settings from the environment (and .env)."""
+    _load_env()
+    return {
+        "host": os.getenv("DB_HOST"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+        "database": os.getenv("DB_NAME"),
+        "port": os.getenv("DB_PORT"),
+    }
+
+
+def load_pool_size():
+    """Size of the shared connection pool, 0 disables pooling."""
+    _load_env()
+    return int(os.getenv("DB_POOL_SIZE", DEFAULT_POOL_SIZE))
+
+
+def _get_pool(config, pool_size):
+    """Return the process-wide pool for this config, creating it on first use."""
+    key = (tuple(sorted(config.items())), pool_size)
+    with _lock:
+        if key not in _pools:
+            _pools[key] = mysql.connector.pooling.MySQLConnectionPool(
+                pool_name=f"pool_{len(_pools)}",
+                pool_size=pool_size,
+                pool_reset_session=True,
+                **config,
+            )
+            logger.info(f"Created a database connection pool of size {pool_size}.")
+        return _pools[key]
+
 
 class DatabaseConnection:
-    def __init__(self, config):
+    def __init__(self, config, pool_size=None):
         self.config = config
+        self.pool_size = pool_size
         self.connection = None
 
     def connect(self):
         """Establish the database connection."""
         try:
-            self.connection = mysql.connector.connect(**self.config)
+            if self.pool_size:
+                self.connection = self._get_pooled_connection()
+            else:
+                self.connection = mysql.connector.connect(**self.config)
             if self.connection.is_connected():
                 logger.info("Successfully connected to the database.")
         except Exception as e:
             logger.error(f"Error connecting to the database: {e}")
             self.connection = None
 
+    def _get_pooled_connection(self):
+        pool = _get_pool(self.config, self.pool_size)
+        deadline = time.monotonic() + POOL_TIMEOUT
+        while True:
+            try:
+                connection = pool.get_connection()
+                break
+            except mysql.connector.errors.PoolError:
+                # every pooled connection is in use by another thread
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.05)
+
+        # health check, reconnects connections that the server dropped while idle
+        connection.ping(reconnect=True, attempts=3, delay=1)
+        return connection
+
     def close(self):
         """Close the database connection."""
-        if self.connection and self.connection.is_connected():
+        if self.connection is None:
+            return
+        if self.pool_size:
+            # returns the connection to the pool instead of closing it
+            self.connection.close()
+            self.connection = None
+            logger.debug("Database connection returned to the pool.")
+        elif self.connection.is_connected():
             self.connection.close()
             logger.info("Database connection closed.")
 
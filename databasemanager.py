@@ -1,15 +1,15 @@
+import argparse
 import pandas as pd
 import mysql.connector
 import os
-from dotenv import load_dotenv
-from databaseconnection import DatabaseConnection
+from databaseconnection import DatabaseConnection, load_db_config
 from queryexecutor import QueryExecutor
-import openpyxl
+from excelwriter import ExcelWriter
 
 
 class DatabaseManager:
-    def __init__(self, db_config):
-        self.db_connection = DatabaseConnection(db_config)
+    def __init__(self, db_config, pool_size=None):
+        self.db_connection = DatabaseConnection(db_config, pool_size=pool_size)
         self.query_executor = QueryExecutor(self.db_connection)
 
     def connect(self):
@@ -26,6 +26,27 @@ class DatabaseManager:
         """
         return self.query_executor.execute_query(query, params=(m13id,))
 
+    # Resolve the display names of many m13ids with one IN (...) query per chunk.
+    # Returns a {m13id: displayname} dict, ids that are not found are left out,
+    # as are all the ids of a chunk whose query failed.
+    def fetch_names_by_m13_list(self, m13ids, chunk_size=500):
+        m13ids = list(dict.fromkeys(m13id for m13id in m13ids if m13id))
+        names = {}
+        for start in range(0, len(m13ids), chunk_size):
+            chunk = m13ids[start : start + chunk_size]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            query = f"""SELECT m13id, displayname
+            FROM smarter.fdppops
+            WHERE m13id IN ({placeholders});
+            """
+            df = self.query_executor.execute_query(query, params=tuple(chunk))
+            if df.empty:
+                continue
+            # same formatting as fetch_name_by_m13(...).to_string(index=False, header=False)
+            for m13id, displaynames in df.groupby("m13id", sort=False)["displayname"]:
+                names[m13id] = displaynames.to_string(index=False, header=False)
+        return names
+
     def fetch_name_by_ticketid(self, ticket_id):
         query = """SELECT displayname
         FROM smarter.fdppops
@@ -40,6 +61,41 @@ class DatabaseManager:
         """
         return self.query_executor.execute_query(query, params=(ticket_id,))
 
+    # Fetch the messages of many tickets with one IN (...) query per chunk of tickets.
+    # The rows are streamed from the server and yielded as DataFrames of about
+    # rows_per_chunk rows, every ticket is contained in a single DataFrame.
+    # Only the given columns are selected, TicketID is always included.
+    def fetch_messages_by_ticket_list(
+        self,
+        ticket_ids,
+        chunk_size=500,
+        rows_per_chunk=5000,
+        columns=("TicketID", "DateReceivedUTC", "BodyHTML", "MessageDirection"),
+    ):
+        columns = ["TicketID"] + [column for column in columns if column != "TicketID"]
+        ticket_ids = list(dict.fromkeys(ticket_ids))
+        for start in range(0, len(ticket_ids), chunk_size):
+            chunk = ticket_ids[start : start + chunk_size]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            query = f"""SELECT {", ".join(columns)}
+            FROM smarter.st_ticketmessages
+            WHERE TicketID IN ({placeholders})
+            ORDER BY TicketID, DateReceivedUTC;
+            """
+            # the last ticket of a streamed chunk may continue in the next one
+            pending = None
+            for rows in self.query_executor.stream_query(
+                query, params=tuple(chunk), chunk_size=rows_per_chunk
+            ):
+                if pending is not None:
+                    rows = pd.concat([pending, rows], ignore_index=True)
+                is_last_ticket = rows["TicketID"] == rows["TicketID"].iloc[-1]
+                pending = rows[is_last_ticket]
+                if not is_last_ticket.all():
+                    yield rows[~is_last_ticket]
+            if pending is not None:
+                yield pending
+
     # Fetch a list of IDs based on the parameters (LIMIT amount of records from the year YEAR)
     def fetch_id_list(self, limit, year):
         query = """SELECT *
@@ -80,6 +136,48 @@ class DatabaseManager:
         with open(file_name, "w") as file:
             file.write(conversation)
 
+    # Save the conversation of every ticket in id_df (a fetch_id_list result) as
+    # messages/<m13id>.txt. The names and m13ids are taken from id_df, so the only
+    # queries are the chunked message fetches. Returns the number of files written.
+    def export_conversations(self, id_df, folder_path="messages", chunk_size=500):
+        tickets = id_df.drop_duplicates("ticketid").set_index("ticketid")
+        if not os.path.exists(folder_path):
+            os.makedirs(folder_path)
+
+        exported = 0
+        for messages in self.fetch_messages_by_ticket_list(
+            tickets.index.tolist(),
+            chunk_size=chunk_size,
+            columns=["TicketID", "BodyHTML", "MessageDirection"],
+        ):
+            if messages.empty:
+                continue
+            conversations = self._build_conversations(messages, tickets["displayname"])
+            for ticket_id, conversation in conversations.items():
+                m13id = tickets.at[ticket_id, "m13id"]
+                with open(f"{folder_path}/{m13id}.txt", "w") as file:
+                    file.write(conversation)
+                exported += 1
+
+        missing = len(tickets) - exported
+        if missing:
+            print(f"No records found for {missing} of {len(tickets)} tickets")
+        return exported
+
+    # Same format as save_conversation_as_txt, built for all tickets of a chunk at once
+    @staticmethod
+    def _build_conversations(messages, contact_names):
+        direction = messages["MessageDirection"]
+        body = messages["BodyHTML"].map(str)
+        names = messages["TicketID"].map(contact_names).map(str)
+
+        lines = pd.Series(None, index=messages.index, dtype=object)
+        lines[direction == 0] = names[direction == 0] + ": " + body[direction == 0]
+        lines[direction == 1] = "AGENT: " + body[direction == 1]
+        lines = lines.dropna()  # other directions should never happen
+
+        return lines.groupby(messages["TicketID"], sort=False).agg("\n".join)
+
     def save_control_data_to_excel(self, df, year):
         control_df = df[
             [
@@ -128,69 +226,48 @@ class DatabaseManager:
             "Gender",
         ]
 
-        if os.path.exists(excel_file_name):
-            # Load the existing workbook and select the active worksheet
-            wb = openpyxl.load_workbook(excel_file_name)
-            ws = wb.active
-
-            # Ensure the headers are consistent
-            existing_headers = [cell.value for cell in ws[1]]
-            if existing_headers != headers:
-                raise ValueError("Existing headers do not match the required headers!")
-        else:
-            # Create a new workbook and set up the sheet
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Control Data"
-            ws.append(headers)  # Add headers to the new sheet
-
-        # Append new data
-        for row in control_df.itertuples(index=False, name=None):
-            ws.append(row)
+        # a one-shot dump, saved once on close
+        with ExcelWriter(
+            excel_file_name,
+            headers,
+            title="Control Data",
+            batch_size=None,
+            check_headers=True,
+        ) as writer:
+            # Append new data
+            for row in control_df.itertuples(index=False, name=None):
+                writer.append(row)
 
-        # Save the workbook
-        wb.save(excel_file_name)
 
-
-# Example usage
+# Example usage: python3 databasemanager.py --year 2024 --limit 500 --export-conversations
 if __name__ == "__main__":
-    load_dotenv()
-    db_config = {
-        "host": os.getenv("DB_HOST"),
-        "user": os.getenv("DB_USER"),
-        "password": os.getenv("DB_PASSWORD"),
-        "database": os.getenv("DB_NAME"),
-        "port": os.getenv("DB_PORT"),
-    }
-
-    db_manager = DatabaseManager(db_config)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--year", type=int, default=2024, help="Year of the records")
+    parser.add_argument(
+        "--limit", type=int, default=500, help="Maximum number of records"
+    )
+    parser.add_argument(
+        "--export-conversations",
+        action="store_true",
+        help="Also save the conversations as plain texts in the messages folder",
+    )
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(load_db_config())
     db_manager.connect()
 
     try:
-        # NOTE: Modify the year here
-        year = 2024
-        limit = 500
-
-        # Fetch 100 data from the year 2024
-        df = db_manager.fetch_id_list(limit=limit, year=year)
+        # Fetch LIMIT records from the year YEAR
+        df = db_manager.fetch_id_list(limit=args.limit, year=args.year)
 
         print(df.columns)  # debug
 
         # Save the "control data" to an excel sheet
-        db_manager.save_control_data_to_excel(df=df, year=year)
+        db_manager.save_control_data_to_excel(df=df, year=args.year)
 
         # Save the conversations as plain texts
-        # id_list = df["ticketid"].tolist()
-        # for id_value in id_list:
-        #     df = db_manager.fetch_messages_by_ticketid(id_value)
-        #     if not df.empty:
-        #         name = db_manager.fetch_name_by_ticketid(id_value).to_string(
-        #             index=False, header=False
-        #         )
-        #         db_manager.save_conversation_as_txt(
-        #             df=df, ticket_id=id_value, contact_name=name
-        #         )
-        #     else:
-        #         print(f"No records found for ID: {id_value}")
+        if args.export_conversations:
+            exported = db_manager.export_conversations(df)
+            print(f"Exported {exported} conversations")
     finally:
-        db_manager.close()
+        db_manager.disconnect()
@@ -0,0 +1,125 @@
+import logging
+import re
+import threading
+from collections import namedtuple
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DISTRICTS_FILE = "kota_kab.csv"
+KABUPATEN = "KABUPATEN"
+KOTA = "KOTA"
+
+District = namedtuple("District", ["level", "province_code"])
+
+# "Kabupaten Bogor", "Kab. Bogor", "Kab Bogor" or "Kota Bogor"
+_PREFIX = re.compile(r"^(kabupaten|kab|kota)(?:\.\s*|\s+)")
+_PREFIX_LEVELS = {"kabupaten": KABUPATEN, "kab": KABUPATEN, "kota": KOTA}
+_ABBREVIATIONS = [(re.compile(r"\bkep\.\s*"), "kepulauan ")]
+# spaces, hyphens and dots are left out of the keys: "Toli-Toli", "Tolitoli"
+# and "Toli Toli" are the same district
+_SEPARATORS = re.compile(r"[^a-z0-9]")
+
+# Other names of districts, normalized, to the normalized name in DISTRICTS_FILE
+ALIASES = {
+    "pangkep": "pangkajenedankepulauan",
+    "sitaro": "siautagulandangbiaro",
+    "toba": "tobasamosir",
+    "padangsidempuan": "padangsidimpuan",
+    "jogja": "yogyakarta",
+    "jogjakarta": "yogyakarta",
+    "yogya": "yogyakarta",
+    "jakpus": "jakartapusat",
+    "jakut": "jakartautara",
+    "jakbar": "jakartabarat",
+    "jaksel": "jakartaselatan",
+    "jaktim": "jakartatimur",
+}
+
+
+def _normalize(name):
+    for pattern, replacement in _ABBREVIATIONS:
+        name = pattern.sub(replacement, name)
+    name = _SEPARATORS.sub("", name)
+    return ALIASES.get(name, name)
+
+
+def _normalize_column(names):
+    for pattern, replacement in _ABBREVIATIONS:
+        names = names.str.replace(pattern, replacement, regex=True)
+    names = names.str.replace(_SEPARATORS, "", regex=True)
+    return names.replace(ALIASES)
+
+
+class DistrictIndex:
+    """The kota/kabupaten of Indonesia, by normalized name.
+
+    A name without a prefix resolves to the first district of that name in the
+    file, e.g. "Bogor" is KABUPATEN BOGOR and not KOTA BOGOR, and a name with a
+    prefix to the district of that level if there is one.
+    """
+
+    def __init__(self, df):
+        self._index = {}
+        for row in df.itertuples():
+            level, _, name = row.name.strip().partition(" ")
+            district = District(level.upper(), int(row.foreign))
+            key = _normalize(name.lower())
+            self._index.setdefault(key, district)
+            self._index.setdefault(f"{level.lower()}:{key}", district)
+
+    @classmethod
+    def from_csv(cls, file_name=DISTRICTS_FILE):
+        return cls(pd.read_csv(file_name))
+
+    def __len__(self):
+        return len(self._index)
+
+    def lookup(self, name):
+        """Return the District of a kota/kabupaten name, or None."""
+        name = name.strip().lower()
+        prefix = _PREFIX.match(name)
+        key = _normalize(name[prefix.end() :] if prefix else name)
+        district = None
+        if prefix:
+            level = _PREFIX_LEVELS[prefix.group(1)]
+            district = self._index.get(f"{level.lower()}:{key}")
+        return district or self._index.get(key)
+
+    def find_level(self, name):
+        """Return KABUPATEN or KOTA for a district name, or None if it is unknown.
+
+        A name starting with "kota" is a KOTA even if it is not in the file.
+        """
+        if name is None or not name.split():
+            return None
+        if name.lower().split()[0] == "kota":
+            return KOTA
+        district = self.lookup(name)
+        return district.level if district else None
+
+    def find_levels(self, names):
+        """find_level of a whole Series of names at once, None where unknown."""
+        lowered = names.str.strip().str.lower()
+        prefixes = lowered.str.extract(_PREFIX, expand=False)
+        keys = _normalize_column(lowered.str.replace(_PREFIX, "", regex=True))
+        qualified = prefixes.map(_PREFIX_LEVELS).str.lower() + ":" + keys
+
+        levels = {key: district.level for key, district in self._index.items()}
+        found = qualified.map(levels).fillna(keys.map(levels))
+        found = found.mask(lowered.str.split().str[0] == "kota", KOTA)
+        return found.astype(object).where(found.notna(), None)
+
+
+_district_index = None
+_district_index_lock = threading.Lock()
+
+
+def get_district_index():
+    """Return the process-wide DistrictIndex, loading it on first use."""
+    global _district_index
+    if _district_index is None:
+        with _district_index_lock:
+            if _district_index is None:
+                _district_index = DistrictIndex.from_csv()
+    return _district_index
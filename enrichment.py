@@ -0,0 +1,120 @@
+# Bulk version of Contact.init_level: the addresses of a whole batch of contacts
+# are resolved with a few joins against the gazetteer instead of one lookup per
+# contact, with the same results.
+import logging
+from functools import lru_cache
+import pandas as pd
+import utility
+from addressresolver import get_address_resolver
+from districts import get_district_index
+from gazetteer import ADMIN1, ADMIN2, ADMIN3, ADMIN4, get_gazetteer
+
+logger = logging.getLogger(__name__)
+
+ADDRESS_FIELDS = ["province", "city", "kecamatan", "address"]
+# the field set when the kecamatan input turns out to be another category, in
+# the order init_level tries them
+OTHER_CATEGORIES = [(ADMIN4, "address"), (ADMIN2, "city"), (ADMIN1, "province")]
+
+
+@lru_cache(maxsize=8)
+def _first_rows(gazetteer, column):
+    # like Gazetteer.lookup(column, name).iloc[0], by lowercase name
+    df = gazetteer.df.dropna(subset=[column])
+    df = df.assign(key=df[column].str.lower()).drop_duplicates("key")
+    return df.set_index("key")
+
+
+def _lowered(values):
+    # non-string names are never matched
+    return values.where(values.map(lambda value: isinstance(value, str))).str.lower()
+
+
+def enrich(df):
+    """Resolve the address fields and the level of a DataFrame of contacts.
+
+    df has the columns of ADDRESS_FIELDS. Returns a copy with the address
+    fields updated and a "level" column, as Contact.init_level would set them.
+    """
+    df = df[ADDRESS_FIELDS].copy()
+    df["level"] = None
+    gazetteer = get_gazetteer()
+    kecamatan = _lowered(df["kecamatan"])
+    pending = kecamatan.notna() & (kecamatan != "")
+
+    # the kecamatan, the level comes from its first kota/kabupaten
+    kecamatan_rows = _first_rows(gazetteer, ADMIN3)
+    found = pending & kecamatan.isin(kecamatan_rows.index)
+    cities = kecamatan[found].map(kecamatan_rows[ADMIN2])
+    df.loc[found, "level"] = get_district_index().find_levels(cities)
+    pending &= ~found
+
+    # or the exact name of a desa, city or province
+    for column, field in OTHER_CATEGORIES:
+        found = pending & kecamatan.isin(_first_rows(gazetteer, column).index)
+        df.loc[found, field] = df.loc[found, "kecamatan"]
+        pending &= ~found
+
+    # or a misspelled name of any of them, the kecamatan first
+    scopes = [
+        {ADMIN1: province, ADMIN2: city}
+        for province, city in zip(df["province"], df["city"])
+    ]
+    resolver = get_address_resolver()
+    for column, field in [(ADMIN3, "kecamatan")] + OTHER_CATEGORIES:
+        if not pending.any():
+            break
+        positions = pending.to_numpy().nonzero()[0]
+        resolved = pd.Series(
+            resolver.resolve_many(
+                df["kecamatan"].iloc[positions].tolist(),
+                column,
+                [scopes[position] for position in positions],
+            ),
+            index=df.index[positions],
+            dtype=object,
+        ).dropna()
+        if resolved.empty:
+            continue
+        # the gazetteer's spelling, as addressservice.validate returns it
+        rows = _first_rows(gazetteer, column).loc[resolved.str.lower()]
+        df.loc[resolved.index, field] = rows[column].to_numpy()
+        if column == ADMIN3:
+            levels = get_district_index().find_levels(rows[ADMIN2])
+            df.loc[resolved.index, "level"] = levels.to_numpy()
+        pending.loc[resolved.index] = False
+
+    logger.info(
+        f"Enriched {len(df)} contacts: {df['level'].notna().sum()} with a level, "
+        f"{pending.sum()} without a match."
+    )
+    return df
+
+
+def contacts_to_frame(contacts):
+    """A DataFrame of the fields of the rows of the contacts, without the level."""
+    fields = [field for field in utility.ROW_FIELDS if field != "level"]
+    return pd.DataFrame(
+        [[getattr(contact, field) for field in fields] for contact in contacts],
+        columns=fields,
+        dtype=object,  # keeps None as None, str(None) is what contact_to_row writes
+    )
+
+
+def enrich_contacts(contacts):
+    """Enrich a batch of contacts in place, returns their rows for the output workbook.
+
+    The rows are built from the enriched DataFrame: reading Contact.level of a
+    contact without a level would run init_level again.
+    """
+    df = contacts_to_frame(contacts)
+    enriched = enrich(df)
+    df[ADDRESS_FIELDS + ["level"]] = enriched
+    for contact, values in zip(contacts, enriched.itertuples(index=False)):
+        contact.province = values.province
+        contact.city = values.city
+        contact.kecamatan = values.kecamatan
+        contact.address = values.address
+        if values.level is not None:
+            contact.level = values.level
+    return df[utility.ROW_FIELDS].map(str).values.tolist()
@@ -0,0 +1,109 @@
+import logging
+import os
+import time
+import openpyxl
+
+logger = logging.getLogger(__name__)
+
+
+class ExcelWriter:
+    """Keeps an output workbook open and saves the appended rows in batches.
+
+    The workbook is loaded (or created with the headers) once. Rows are appended
+    in memory and the file is saved every `batch_size` rows (never with None),
+    after `checkpoint_interval` seconds, and on close. Each save goes to a
+    temporary file that then replaces the workbook, so a crash mid-run keeps the
+    last checkpoint intact. If given, `on_flush` is called after every save with the
+    keys of the rows that were saved.
+    """
+
+    def __init__(
+        self,
+        file_name,
+        headers,
+        title="Contacts",
+        batch_size=50,
+        checkpoint_interval=None,
+        check_headers=False,
+        on_flush=None,
+    ):
+        self.file_name = file_name
+        self.headers = headers
+        self.title = title
+        self.batch_size = batch_size
+        self.checkpoint_interval = checkpoint_interval
+        self.check_headers = check_headers
+        self.on_flush = on_flush
+        self.wb = None
+        self.ws = None
+        self._unsaved_rows = 0
+        self._unsaved_keys = []
+        self._last_save = time.monotonic()
+
+    def __enter__(self):
+        if self.wb is None:
+            self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        """Load the existing workbook or create a new one with the headers."""
+        if os.path.exists(self.file_name):
+            self.wb = openpyxl.load_workbook(self.file_name)
+            self.ws = self.wb.active
+
+            # Ensure the headers are consistent
+            existing_headers = [cell.value for cell in self.ws[1]]
+            if self.check_headers and existing_headers != self.headers:
+                raise ValueError(
+                    f"Existing headers of {self.file_name} do not match the required "
+                    f"headers! Expected {self.headers}, found {existing_headers}."
+                )
+        else:
+            self.wb = openpyxl.Workbook()
+            self.ws = self.wb.active
+            self.ws.title = self.title
+            self.ws.append(self.headers)
+            self._unsaved_rows += 1
+        self._last_save = time.monotonic()
+
+    def append(self, row, key=None):
+        """Append one row, saving the workbook when a checkpoint is due."""
+        if self.wb is None:
+            self.open()
+        self.ws.append(row)
+        self._unsaved_rows += 1
+        if key is not None:
+            self._unsaved_keys.append(key)
+
+        if (self.batch_size is not None and self._unsaved_rows >= self.batch_size) or (
+            self.checkpoint_interval is not None
+            and time.monotonic() - self._last_save >= self.checkpoint_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        """Save the workbook if there are unsaved rows."""
+        if self.wb is None or self._unsaved_rows == 0:
+            return
+        temp_file = f"{self.file_name}.tmp"
+        self.wb.save(temp_file)
+        os.replace(temp_file, self.file_name)
+        logger.debug(f"Saved {self._unsaved_rows} new rows to {self.file_name}")
+        saved_keys = self._unsaved_keys
+        self._unsaved_rows = 0
+        self._unsaved_keys = []
+        self._last_save = time.monotonic()
+        if self.on_flush is not None and saved_keys:
+            self.on_flush(saved_keys)
+
+    def close(self):
+        """Save the remaining rows and release the workbook."""
+        if self.wb is None:
+            return
+        self.flush()
+        self.wb.close()
+        self.wb = None
+        self.ws = None
@@ -0,0 +1,138 @@
+# The "lean" extraction prompt. The instructions are a system message that is the
+# same for every conversation, so OpenAI's prompt caching can reuse them, and the
+# response is constrained to a JSON schema of only the fields that are used.
+# With audit=True the schema also asks for the reasoning and confidence of every
+# field, like the full prompt in main.py.
+
+LEAN_PROMPT_VERSION = "extraction-lean-1"
+
+
+class SummaryMode:
+    OFF = "off"  # no narrative summary
+    SEPARATE = "separate"  # a second request with the summary prompt
+    COMBINED = "combined"  # the summary is one more field of the extraction
+
+
+# The narrative summary of the summary prompt, as a field of the extraction
+SUMMARY_KEY = "summary_paragraph"
+SUMMARY_INSTRUCTIONS = "A paragraph in Indonesian with 1. the name of the agent or mediator that was last to speak with the contact, 2. the contact's initial felt need, what he/she asked or talked about in the beginning of the conversation, 3. a summary of the Agent's explanation about Isa Al-Masih (refer to Isa Al-Masih as IAM), aimed to console or give advice to the contact after they talk about their felt need, and 4. the contact's opinion about Isa Al-Masih according to the Gospel (IAM versi Injil)."
+
+# The fields with a *_reasoning and *_confidence pair in the audit schema, in
+# the order of the full prompt
+RESULT_FIELDS = [
+    "name",
+    "occupation",
+    "education",
+    "age",
+    "handphone",
+    "marriage",
+    "gender",
+    "address_province",
+    "address_city",
+    "address_kecamatan",
+    "address_detail",
+    "suku",
+    "status_hp",
+    "attitude",
+]
+PERSONA_KEYS = [
+    "persona_initial_problem",
+    "persona_initial_theme",
+    "persona_pressing_problem",
+    "persona_pressing_theme",
+]
+# The free text fields, the summary only with summary=True. chunking.py combines
+# them from all the chunks of a long conversation.
+TEXT_KEYS = ["comments", "comments_idn", "recommendation", "extra_info", SUMMARY_KEY]
+
+LEAN_SYSTEM_PROMPT = """You are a staff member of a non-profit mission agency. Disregard previous knowledge and focus only on the given conversation between another staff member and a potential contact for evangelization. Extract the following data points in Indonesian. Leave a field empty if the conversation does not mention it.
+
+- name_result: The name of the contact has been anonymized to 'Tian'. So Tian will be the name.
+- occupation_result: The contact's current job or profession.
+- education_result: The highest level of education attained by the contact.
+- age_result: The age of the contact.
+- handphone_result: The contact's phone number.
+- marriage_result: The contact's marital status, one of Lajang (single), Menikah (married) or Janda/Duda (divorced or a widow/widower).
+- persona_initial_problem: The issue that first prompted the contact to reach out to the agency staff. This is typically found at the beginning of the conversation in the contact's first message.
+- persona_initial_theme: The theme of the initial problem, one of Spiritual (Rohani), Economy/Work (Ekonomi/Keuangan), Relationship/Family (Hubungan/Keluarga), Personal/Lifestyle (Personal/Gaya hidup), Health/Sickness (Kesehatan/Penyakit).
+- persona_pressing_problem: The most urgent issue currently facing the contact. This could be the same as the initial problem or a different one.
+- persona_pressing_theme: The theme of the pressing problem, from the same categories as the initial theme.
+- gender_result: The gender of the contact.
+- address_province_result: The province in which the contact resides.
+- address_city_result: The city or district (kota or kabupaten) where the contact lives.
+- address_kecamatan_result: The subdistrict where the contact lives.
+- address_detail_result: Any additional specific details about the contact's location that can be inferred from the conversation.
+- suku_result: The ethnic group or tribe the contact belongs to, if mentioned.
+- status_hp_result: How the contact's phone number can be contacted. WA when the contact gives his/her phone number to the agent when requested (the most common case), Both when the contact attempted to call the staff, Telp when the contact doesn't have Whatsapp (wa) and can only be contacted through a regular phone call (the least common case).
+- attitude_result: The general demeanor or attitude of the contact, one of Open (Terbuka), Not Open (Tidak Terbuka) or Group (Kelompok) if the contact's family member or friend/s are also interested to learn about the gospel.
+- comments: A short summary about the conversation. Do not put any identifiable information in the summary. Refer to the contact as 'COD'.
+- comments_idn: comments but translated in Indonesian.
+- recommendation: A recommendation on how to approach or evangelize this person.
+- extra_info: Any other additional information that is important for a staff person to know such as when the contact is available to be contacted or to meet in person, or any other information that is unique to the contact."""
+
+AUDIT_INSTRUCTIONS = """
+
+For each *_result field, also give the reasoning behind your answer in *_reasoning, explaining why you believe it to be correct, and your level of confidence in *_confidence as a percentage representing the probability this answer might be correct."""
+
+
+def extraction_keys(audit=False, summary=False):
+    """Return the keys of the lean response, in the order of the full prompt."""
+    keys = []
+    for field in RESULT_FIELDS:
+        keys.append(f"{field}_result")
+        if audit:
+            keys.extend([f"{field}_reasoning", f"{field}_confidence"])
+        if field == "marriage":
+            keys.extend(PERSONA_KEYS)
+    keys += [key for key in TEXT_KEYS if summary or key != SUMMARY_KEY]
+    return keys
+
+
+def response_format(audit=False, summary=False):
+    """The structured output schema of the lean extraction."""
+    keys = extraction_keys(audit, summary)
+    name = "contact"
+    if audit:
+        name += "_audit"
+    if summary:
+        name += "_summary"
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": name,
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {key: {"type": "string"} for key in keys},
+                "required": keys,
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def prompt_version(audit=False, summary=False):
+    version = LEAN_PROMPT_VERSION
+    if audit:
+        version += "-audit"
+    if summary:
+        version += "-summary"
+    return version
+
+
+def lean_messages(text, part_note="", audit=False, summary=False):
+    """Build the messages of a lean extraction request.
+
+    Only the user message changes between conversations, it comes last so the
+    system message is a stable prefix.
+    """
+    system_prompt = LEAN_SYSTEM_PROMPT
+    if summary:
+        system_prompt += f"\n- {SUMMARY_KEY}: {SUMMARY_INSTRUCTIONS}"
+    if audit:
+        system_prompt += AUDIT_INSTRUCTIONS
+    user_prompt = f"{part_note}\n\nText: {text}" if part_note else f"Text: {text}"
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
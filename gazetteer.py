@@ -0,0 +1,129 @@
+import logging
+import os
+import pickle
+import threading
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DATABASE_FILE = "idn_admin4boundaries_tabulardata.xlsx"
+# compiled copy of the admin columns of DATABASE_FILE, rebuilt when the workbook changes
+DATABASE_CACHE_FILE = "idn_admin4boundaries_tabulardata.cache.pkl"
+ADMIN1 = "admin1Name_en"  # province
+ADMIN2 = "admin2Name_en"  # kota/kabupaten
+ADMIN3 = "admin3Name_en"  # kecamatan
+ADMIN4 = "admin4Name_en"  # desa
+ADMIN_COLUMNS = [ADMIN4, ADMIN3, ADMIN2, ADMIN1]
+
+
+class Gazetteer:
+    """Administrative boundaries of Indonesia (desa, kecamatan, kota/kabupaten, province).
+
+    The boundaries are kept in a single DataFrame, and every admin column has a
+    precomputed lowercase name -> row positions index so that lookups are a
+    dictionary access instead of a full-column scan.
+    """
+
+    def __init__(self, df):
+        self.df = df[ADMIN_COLUMNS].reset_index(drop=True)
+        self._indexes = {
+            column: self._build_index(self.df[column]) for column in ADMIN_COLUMNS
+        }
+
+    @classmethod
+    def from_excel(cls, file_name=DATABASE_FILE):
+        """Parse every sheet of the boundary workbook into one Gazetteer."""
+        excel_book = pd.ExcelFile(file_name)
+        all_sheets = {}
+        for sheet_name in excel_book.sheet_names:
+            all_sheets[sheet_name] = excel_book.parse(sheet_name)
+
+        df = pd.concat(all_sheets.values(), ignore_index=True)
+        logger.info(f"Loaded {len(df)} administrative boundaries from {file_name}")
+        return cls(df)
+
+    @classmethod
+    def load(cls, file_name=DATABASE_FILE, cache_file=DATABASE_CACHE_FILE):
+        """Load the Gazetteer from the binary cache, parsing the workbook only if the cache is stale."""
+        df = _read_cache(file_name, cache_file)
+        if df is not None:
+            return cls(df)
+
+        gazetteer = cls.from_excel(file_name)
+        _write_cache(gazetteer.df, file_name, cache_file)
+        return gazetteer
+
+    @staticmethod
+    def _build_index(column):
+        # NaN names are dropped by groupby, non-string values are lowered to NaN
+        lowered = column.str.lower()
+        return lowered.groupby(lowered, sort=False).indices
+
+    def contains(self, column, name):
+        """Check if the name exists (case-insensitive) in the given admin column."""
+        return name.lower() in self._indexes[column]
+
+    def lookup(self, column, name):
+        """Return the rows whose admin column matches the name (case-insensitive), or None."""
+        positions = self._indexes[column].get(name.lower())
+        if positions is None:
+            return None
+        return self.df.iloc[positions]
+
+
+# The cache is stamped with the size and mtime of the workbook it was built from
+def _source_stamp(file_name):
+    stat = os.stat(file_name)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def _read_cache(file_name, cache_file):
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with open(cache_file, "rb") as f:
+            cache = pickle.load(f)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable gazetteer cache {cache_file}: {e}")
+        return None
+
+    if not os.path.exists(file_name):
+        logger.warning(f"{file_name} not found, using the cached copy {cache_file}")
+        return cache["df"]
+    if cache.get("source_stamp") != _source_stamp(file_name):
+        logger.info(f"{file_name} changed since {cache_file} was built, rebuilding")
+        return None
+    return cache["df"]
+
+
+def _write_cache(df, file_name, cache_file):
+    cache = {"source_stamp": _source_stamp(file_name), "df": df}
+    # write to a temporary file first so that a crash never leaves a truncated cache
+    temp_file = f"{cache_file}.tmp"
+    try:
+        with open(temp_file, "wb") as f:
+            pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, cache_file)
+        logger.info(f"Saved gazetteer cache to {cache_file}")
+    except OSError as e:
+        logger.warning(f"Could not write gazetteer cache {cache_file}: {e}")
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """Return the process-wide Gazetteer, loading it on first use."""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer.load()
+    return _gazetteer
+
+
+# Build (or refresh) the cache ahead of time: python3 gazetteer.py
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    get_gazetteer()
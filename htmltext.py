@@ -0,0 +1,192 @@
+import re
+from collections import Counter
+from html.parser import HTMLParser
+from bs4.builder import HTMLTreeBuilder
+from bs4.dammit import EntitySubstitution, UnicodeDammit
+
+try:
+    import lxml.html
+except ImportError:  # lxml is optional, only needed for html_to_text_lxml
+    lxml = None
+
+# The rules BeautifulSoup(markup, "html.parser") applies while building its tree,
+# taken from bs4 itself so that html_to_text stays in sync with get_text()
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+EMPTY_ELEMENT_TAGS = HTMLTreeBuilder.DEFAULT_EMPTY_ELEMENT_TAGS
+PRESERVE_WHITESPACE_TAGS = HTMLTreeBuilder.DEFAULT_PRESERVE_WHITESPACE_TAGS
+# strings inside these tags (script, style, template, rt, rp) are left out of get_text()
+STRING_CONTAINER_TAGS = set(HTMLTreeBuilder.DEFAULT_STRING_CONTAINERS)
+
+_DECIMAL_REFERENCE = re.compile("^([0-9]+)(.*)")
+_HEX_REFERENCE = re.compile("^([0-9a-f]+)(.*)")
+_MARKUP_CHARS = re.compile("[<&]")
+
+
+class _TextExtractor(HTMLParser):
+    """Collects the text of a document without building a tree.
+
+    The output is the same as BeautifulSoup(markup, "html.parser").get_text().
+    Only the tag names of the open elements are tracked, which is all that
+    decides whether a string is kept and whether its whitespace is collapsed.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.text = []
+        self._data = []  # data of the current string, between two tags
+        self._open_tags = []
+        self._open_tag_counter = Counter()
+        self._preserve_whitespace_stack = []  # indexes into self._open_tags
+        self._string_container_stack = []  # indexes into self._open_tags
+        self._already_closed_empty_element = []
+
+    def _end_data(self, keep=True):
+        if not self._data:
+            return
+        data = "".join(self._data)
+        self._data = []
+        # If whitespace is not preserved, and this string contains nothing but
+        # ASCII spaces, replace it with a single space or newline.
+        if not self._preserve_whitespace_stack and all(
+            char in ASCII_SPACES for char in data
+        ):
+            data = "\n" if "\n" in data else " "
+        if keep:
+            self.text.append(data)
+
+    def _push_tag(self, tag):
+        index = len(self._open_tags)
+        self._open_tags.append(tag)
+        self._open_tag_counter[tag] += 1
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self._preserve_whitespace_stack.append(index)
+        if tag in STRING_CONTAINER_TAGS:
+            self._string_container_stack.append(index)
+
+    def _pop_tag(self):
+        index = len(self._open_tags) - 1
+        tag = self._open_tags.pop()
+        self._open_tag_counter[tag] -= 1
+        for stack in (self._preserve_whitespace_stack, self._string_container_stack):
+            if stack and stack[-1] == index:
+                stack.pop()
+
+    def _pop_to_tag(self, tag):
+        # pops up to and including the most recent open tag with this name
+        while self._open_tags and self._open_tag_counter[tag]:
+            if self._open_tags[-1] == tag:
+                self._pop_tag()
+                break
+            self._pop_tag()
+
+    def _end_string(self):
+        self._end_data(keep=not self._string_container_stack)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag, check_already_closed=False)
+
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        self._end_string()
+        self._push_tag(tag)
+        if tag in EMPTY_ELEMENT_TAGS and handle_empty_element:
+            self.handle_endtag(tag, check_already_closed=False)
+            self._already_closed_empty_element.append(tag)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self._already_closed_empty_element:
+            self._already_closed_empty_element.remove(tag)
+        else:
+            self._end_string()
+            self._pop_to_tag(tag)
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_charref(self, name):
+        base = 10
+        reference = _DECIMAL_REFERENCE
+        if name.startswith("x") or name.startswith("X"):
+            name = name[1:]
+            base = 16
+            reference = _HEX_REFERENCE
+
+        extra_data = ""
+        numeric = None
+        try:
+            numeric = int(name, base)
+        except ValueError:
+            # a reference that was not terminated by a semicolon, the rest is data
+            match = reference.search(name)
+            if match is not None:
+                numeric = int(match.group(1), base)
+                extra_data = match.group(2)
+
+        if numeric is None:
+            self.handle_data("")
+            self.handle_data(name)
+        else:
+            self.handle_data(UnicodeDammit.numeric_character_reference(numeric)[0])
+            self.handle_data(extra_data)
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.handle_data(character if character is not None else f"&{name}")
+
+    # comments, declarations and processing instructions are not part of the text
+    def handle_comment(self, data):
+        self._end_string()
+        self.handle_data(data)
+        self._end_data(keep=False)
+
+    def handle_decl(self, decl):
+        self.handle_comment(decl)
+
+    def handle_pi(self, data):
+        self.handle_comment(data)
+
+    def unknown_decl(self, data):
+        self._end_string()
+        if data.upper().startswith("CDATA["):
+            # CDATA sections are kept, even inside a string container
+            self.handle_data(data[len("CDATA[") :])
+            self._end_data()
+        else:
+            self.handle_data(data)
+            self._end_data(keep=False)
+
+    def close(self):
+        super().close()
+        self._end_string()
+
+
+def html_to_text(markup):
+    """Return the text of an HTML document, same as BeautifulSoup(markup, "html.parser").get_text()."""
+    if not _MARKUP_CHARS.search(markup):
+        # plain text, only a whitespace-only document is changed
+        if markup and all(char in ASCII_SPACES for char in markup):
+            return "\n" if "\n" in markup else " "
+        return markup
+
+    parser = _TextExtractor()
+    parser.feed(markup)
+    parser.close()
+    return "".join(parser.text)
+
+
+def html_to_text_lxml(markup):
+    """Return the text of an HTML document using lxml.
+
+    Faster than html_to_text on large documents, but lxml repairs markup and
+    handles whitespace differently, so the output is not always identical to
+    BeautifulSoup's.
+    """
+    if lxml is None:
+        raise ImportError("lxml is required for html_to_text_lxml")
+    if not markup.strip():
+        return html_to_text(markup)
+    root = lxml.html.fragment_fromstring(markup, create_parent="div")
+    for element in list(root.iter(*STRING_CONTAINER_TAGS)):
+        # drop_tree keeps the tail, the text that follows the element
+        element.drop_tree()
+    return root.text_content()
@@ -0,0 +1,121 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_FILE = "llm_cache.sqlite"
+
+
+class CacheMode:
+    USE = "use"  # read and write the cache
+    REFRESH = "refresh"  # ignore cached responses but store the new ones
+    BYPASS = "bypass"  # do not touch the cache at all
+
+
+class LLMCache:
+    """Persistent SQLite cache of LLM responses.
+
+    Responses are keyed by a hash of the model, the prompt version and the prompt
+    text. Entries older than `max_age_days` are evicted, and so are the least
+    recently used entries beyond `max_entries`.
+    """
+
+    def __init__(
+        self,
+        path=DEFAULT_CACHE_FILE,
+        mode=CacheMode.USE,
+        max_age_days=30,
+        max_entries=100000,
+    ):
+        if mode not in (CacheMode.USE, CacheMode.REFRESH, CacheMode.BYPASS):
+            raise ValueError(f"Invalid cache mode provided: {mode}.")
+        self.path = path
+        self.mode = mode
+        self.max_age_days = max_age_days
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = None
+
+        if self.mode != CacheMode.BYPASS:
+            # shared by the worker threads, every access holds self._lock
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+                )""")
+            self._connection.commit()
+            self.evict()
+
+    @staticmethod
+    def make_key(model, prompt_version, text):
+        """Hash the model, prompt version and text into a cache key."""
+        digest = hashlib.sha256()
+        for part in (model, prompt_version, text):
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached response for the key, or None."""
+        if self.mode != CacheMode.USE:
+            return None
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or self._is_expired(row[1]):
+                return None
+            self._connection.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+            self._connection.commit()
+        return row[0]
+
+    def set(self, key, response):
+        """Store a response, replacing any previous one for the key."""
+        if self.mode == CacheMode.BYPASS or response is None:
+            return
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            self._connection.commit()
+
+    def evict(self):
+        """Delete expired entries and the least recently used ones beyond max_entries."""
+        if self._connection is None:
+            return
+        with self._lock:
+            deleted = 0
+            if self.max_age_days is not None:
+                deleted += self._connection.execute(
+                    "DELETE FROM responses WHERE created < ?",
+                    (time.time() - self.max_age_days * 86400,),
+                ).rowcount
+            if self.max_entries is not None:
+                deleted += self._connection.execute(
+                    """DELETE FROM responses WHERE key NOT IN (
+                    SELECT key FROM responses ORDER BY accessed DESC LIMIT ?
+                    )""",
+                    (self.max_entries,),
+                ).rowcount
+            self._connection.commit()
+        if deleted:
+            logger.info(f"Evicted {deleted} entries from the LLM cache.")
+
+    def _is_expired(self, created):
+        if self.max_age_days is None:
+            return False
+        return created < time.time() - self.max_age_days * 86400
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -1,5 +1,24 @@
-import re
+from addressresolver import get_address_resolver
+from anonymizer import Anonymizer, NAME_PLACEHOLDER, PHONE_PLACEHOLDER
+import batchrunner
+import chunking
+import enrichment
+import extraction
+from extraction import SummaryMode
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from databaseconnection import load_db_config, load_pool_size
 from databasemanager import DatabaseManager
+from districts import get_district_index
+from excelwriter import ExcelWriter
+import gazetteer
+from llmcache import LLMCache
+from ratelimiter import DEFAULT_RETRY_AFTER, RateLimiter, retry_after_seconds
+from runmanifest import RunManifest, Stage
+from stagetimer import StageTimer
+import json
 import logging
 import openai
 import os
@@ -9,8 +28,38 @@ from httpx import HTTPStatusError
 import time
 
 
-PHONE_PLACEHOLDER = "08123456789"
-NAME_PLACEHOLDER = "Tian"
+_anonymizer = Anonymizer(NAME_PLACEHOLDER, PHONE_PLACEHOLDER)
+
+MODEL = "gpt-4o-mini"
+# Bump these whenever the corresponding prompt changes, so that cached
+# responses of the old prompt are not reused
+EXTRACTION_PROMPT_VERSION = "extraction-1"
+SUMMARY_PROMPT_VERSION = "summary-1"
+
+logger = logging.getLogger(__name__)
+
+llm_cache = None  # LLMCache, set up in __main__
+
+# The lean extraction (extraction.py) sends the instructions as a static system
+# message and gets back only the used fields, set up in __main__. With
+# extraction_audit the reasoning and confidence of every field are kept.
+lean_extraction = False
+extraction_audit = False
+
+# off | separate (a second request with prompt_summary) | combined (the summary
+# is one more field of the extraction), set up in __main__
+summary_mode = SummaryMode.OFF
+
+# Shared by all worker threads to stay within the requests/minute and
+# tokens/minute limits, set up in __main__ (None sends requests unthrottled)
+rate_limiter = None
+max_retries = 5  # retries of a request after a 429, connection or server error
+# expected size of a response, counted against the tokens/minute budget until
+# the actual usage is known
+COMPLETION_TOKENS_ESTIMATE = 1000
+
+# timings of the pipeline stages and the token and cache counters of a run
+stage_timer = StageTimer()
 
 
 def setup_logging():
@@ -43,49 +92,92 @@ def anonymize(
     name_placeholder=NAME_PLACEHOLDER,
     phone_placeholder=PHONE_PLACEHOLDER,
 ):
-
     original_name = original_name.replace("(", "").replace(")", "")
-    name_parts = original_name.split()
-    name_pattern = (
-        r"\b("
-        + r"|".join(
-            [re.escape(part) for part in name_parts]
-            + [r"\s+".join(map(re.escape, name_parts))]
-        )
-        + r")\b"
-    )
-    name_with_parentheses_pattern = (
-        r"(" + r"\s+".join(map(re.escape, name_parts)) + r")\s*\(([^)]+)\)"
-    )
-    name_regex = re.compile(name_pattern, re.IGNORECASE)
-    name_with_parentheses_regex = re.compile(
-        name_with_parentheses_pattern, re.IGNORECASE
-    )
-    conversation = name_regex.sub(name_placeholder, conversation)
-    conversation = name_with_parentheses_regex.sub(
-        lambda match: f"{name_placeholder} ({name_placeholder})", conversation
+    if (name_placeholder, phone_placeholder) == (NAME_PLACEHOLDER, PHONE_PLACEHOLDER):
+        anonymizer = _anonymizer
+    else:
+        anonymizer = Anonymizer(name_placeholder, phone_placeholder)
+    conversation, original_phone_numbers = anonymizer.anonymize(
+        conversation, [original_name]
     )
+    return conversation, original_name, original_phone_numbers
 
-    # Anonymize phone numbers
-    phone_pattern = r"(?<!\d)(?:\+62|08)\d{9,}\b"
-
-    phone_regex = re.compile(phone_pattern)
-    original_phone_numbers = phone_regex.findall(conversation)
-    conversation = phone_regex.sub(phone_placeholder, conversation)
 
-    return conversation, original_name, original_phone_numbers
+# Conversations longer than this are not sent in one request but split into
+# chunks of at most this many tokens (map-reduce extraction), set up in __main__.
+# The default leaves room for the instructions and the response in the 128k
+# context window of gpt-4o-mini.
+max_conversation_tokens = 100000
 
 
 def prompt_openai(text, m13id):
-    retries = 3
-    backoff_factor = 2  # Backoff multiplier for exponential backoff
-    delay = 1  # Initial delay in seconds
-    for attempt in range(retries):
+    conversation_tokens = chunking.count_tokens(text, MODEL)
+    if conversation_tokens > max_conversation_tokens:
+        logger.info(
+            f"Conversation ID {m13id} has {conversation_tokens} tokens, "
+            f"extracting it in chunks of at most {max_conversation_tokens} tokens."
+        )
+        return prompt_openai_chunked(text, m13id)
+    return _prompt_extraction(text, m13id)
+
+
+# Map-reduce extraction of a long conversation: the fields are extracted from
+# every chunk separately and then merged locally into one JSON object with the
+# same keys as a single extraction
+def prompt_openai_chunked(text, m13id):
+    chunks = chunking.split_into_chunks(text, max_conversation_tokens, MODEL)
+    outputs = [
+        _prompt_extraction(chunk, m13id, part=(part, len(chunks)))
+        for part, chunk in enumerate(chunks, start=1)
+    ]
+    return _merge_part_outputs(outputs, m13id)
+
+
+# Merges the outputs of the parts of one conversation into one JSON string, or
+# None if no part has a valid output
+def _merge_part_outputs(outputs, m13id):
+    partials = []
+    for part, output in enumerate(outputs, start=1):
+        if output is None:
+            logger.warning(f"No output for part {part}/{len(outputs)} of {m13id}.")
+            continue
         try:
-            prompt = [
-                {
-                    "role": "user",
-                    "content": f"""
+            partials.append(json.loads(utility.clean_json(input_string=output)))
+        except json.decoder.JSONDecodeError as e:
+            logger.warning(
+                f"Invalid JSON for part {part}/{len(outputs)} of {m13id}: {e}"
+            )
+
+    if not partials:
+        return None
+    logger.debug(f"Merging {len(partials)}/{len(outputs)} parts of {m13id}.")
+    return json.dumps(chunking.merge_extractions(partials), ensure_ascii=False)
+
+
+def _part_note(part):
+    if part is None:
+        return ""
+    return (
+        f"The conversation is too long to be sent at once, this is part {part[0]} "
+        f"of {part[1]}. Only use this part, and leave a field empty if this part "
+        "does not mention it."
+    )
+
+
+def _extraction_prompt(text, part=None, summary=False):
+    part_note = _part_note(part)
+    if part_note:
+        part_note = "        " + part_note
+    summary_item = summary_key = ""
+    if summary:
+        summary_item = (
+            f"\n        17. **summary paragraph**: {extraction.SUMMARY_INSTRUCTIONS}"
+        )
+        summary_key = f',\n            "{extraction.SUMMARY_KEY}": ""'
+    return [
+        {
+            "role": "user",
+            "content": f"""
         You are a staff member of a non-profit mission agency. Please disregard previous knowledge and focus only on the given conversation between another staff member and a potential contact for evangelization. Extract the following data points in JSON format in Indonesian, with the specified keys:
 
         1. **name**: The name of the contact has been anonymized to 'Tian'. So Tian will be the name. 
@@ -125,7 +217,7 @@ def prompt_openai(text, m13id):
             - **Not Open (Tidak Terbuka)**
             - **Group (Kelompok)**: If the contact's family member or friend/s are also interested to learn about the gospel.
         15. **recommendation**: A recommendation on how to approach or evangelize this person.
-        16. **extra info**: Any other additional information that is important for a staff person to know such as when the contact is available to be contacted or to meet in person, or any other information that is unique to the contact.
+        16. **extra info**: Any other additional information that is important for a staff person to know such as when the contact is available to be contacted or to meet in person, or any other information that is unique to the contact.{summary_item}
 
         For each field, please provide the reasoning behind your answer, explaining why you believe it to be correct. Additionally, indicate your level of confidence in your answer, specifying a percentage or scale to represent the probability this answer might be correct based on the information you have at hand.
 
@@ -180,61 +272,187 @@ def prompt_openai(text, m13id):
             "comments": "",
             "comments_idn": "",
             "recommendation": "",
-            "extra_info": ""
+            "extra_info": ""{summary_key}
         }}
 
         Please make sure that the JSON formatting is valid. Do not include anything else than the valid JSON format.
-
+{part_note}
         Text: {text}
 
         """,
-                }
-            ]
-            completion = client_openai.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=prompt,
+        }
+    ]
+
+
+# The cache key of an extraction, depends on the prompt (full or lean, with or
+# without the summary) and part
+def _extraction_cache_key(text, part=None):
+    summary = summary_mode == SummaryMode.COMBINED
+    if lean_extraction:
+        prompt_version = extraction.prompt_version(
+            audit=extraction_audit, summary=summary
+        )
+    else:
+        prompt_version = EXTRACTION_PROMPT_VERSION
+        if summary:
+            prompt_version += "-summary"
+    if part is not None:
+        prompt_version += f"-part{part[0]}of{part[1]}"
+    return LLMCache.make_key(MODEL, prompt_version, text)
+
+
+# The arguments of the chat completion of an extraction, also used as the body
+# of the requests in batch mode
+def _extraction_request(text, part=None):
+    summary = summary_mode == SummaryMode.COMBINED
+    if lean_extraction:
+        return {
+            "model": MODEL,
+            "messages": extraction.lean_messages(
+                text, _part_note(part), audit=extraction_audit, summary=summary
+            ),
+            "response_format": extraction.response_format(
+                audit=extraction_audit, summary=summary
+            ),
+        }
+    return {"model": MODEL, "messages": _extraction_prompt(text, part, summary)}
+
+
+def _prompt_extraction(text, m13id, part=None):
+    cache_key = _extraction_cache_key(text, part)
+    cached_output = _get_cached_output(cache_key, m13id)
+    if cached_output is not None:
+        return cached_output
+
+    try:
+        completion = _create_completion(m13id, **_extraction_request(text, part))
+        output = completion.choices[0].message.content
+        logger.debug(output)
+        _set_cached_output(cache_key, output)
+        return output
+    except openai.BadRequestError as e:
+        if e.code == "context_length_exceeded" or "maximum context length" in str(
+            e
+        ):  # Check if the error is token-related
+            print(
+                f"Error: Input text exceeds the token limit for conversation ID: {m13id}."
             )
-            output = completion.choices[0].message.content
-            logger.debug(output)
-            return output
-        except openai.APIError.InvalidRequestError as e:
-            if "maximum context length" in str(
-                e
-            ):  # Check if the error is token-related
-                print(
-                    f"Error: Input text exceeds the token limit for conversation ID: {m13id}."
-                )
-                print("Please clean up the text and try again.")
-                return None
-            else:
-                print(
-                    f"An unexpected error occurred for conversation ID: {m13id}. Error: {e}"
-                )
-                return None
-        except HTTPStatusError as e:
-            if e.response.status_code == 429:
-                logger.error(
-                    f"Rate limit exceeded for conversation ID: {m13id}. Attempt {attempt + 1} of {retries}."
-                )
-                if attempt < retries - 1:
-                    time.sleep(delay)  # Wait before retrying
-                    delay *= backoff_factor  # Exponential backoff
-                else:
-                    logger.error(
-                        f"All retry attempts failed for conversation ID: {m13id}. Please wait and try again later."
-                    )
-                    return None
+            print("Please clean up the text and try again.")
+        else:
+            print(
+                f"An unexpected error occurred for conversation ID: {m13id}. Error: {e}"
+            )
+    except (openai.RateLimitError, HTTPStatusError) as e:
+        if e.response.status_code == 429:
+            logger.error(
+                f"All retry attempts failed for conversation ID: {m13id}. Please wait and try again later."
+            )
+        else:
+            logger.error(
+                f"HTTP error for conversation ID: {m13id}. Status: {e.response.status_code}. Error: {e}"
+            )
+    except Exception as e:
+        print(f"A general error occurred for conversation ID: {m13id}. Error: {e}")
+    return None
+
+
+# This function sends one chat completion through the shared rate limiter. Rate
+# limited requests are retried after the Retry-After time of the response, and
+# connection errors and server errors after an exponential backoff.
+def _create_completion(m13id, **request):
+    estimated_tokens = COMPLETION_TOKENS_ESTIMATE + sum(
+        chunking.count_tokens(message["content"], MODEL)
+        for message in request["messages"]
+    )
+    delay = 1  # Initial delay in seconds of the backoff
+    for attempt in range(max_retries + 1):
+        try:
+            with _rate_limit_slot(estimated_tokens):
+                completion, headers = _send_completion(request)
+        except (openai.RateLimitError, HTTPStatusError) as e:
+            if (
+                e.response.status_code != 429
+                or getattr(e, "code", None) == "insufficient_quota"
+                or attempt == max_retries
+            ):
+                raise
+            logger.warning(
+                f"Rate limit exceeded for conversation ID: {m13id}. Attempt {attempt + 1} of {max_retries + 1}."
+            )
+            stage_timer.count("rate_limited")
+            if rate_limiter is not None:
+                rate_limiter.on_rate_limited(e.response.headers)
             else:
-                logger.error(
-                    f"HTTP error for conversation ID: {m13id}. Status: {e.response.status_code}. Error: {e}"
+                time.sleep(
+                    retry_after_seconds(e.response.headers) or DEFAULT_RETRY_AFTER
                 )
-                return None
-        except Exception as e:
-            print(f"A general error occurred for conversation ID: {m13id}. Error: {e}")
-        return None
+            continue
+        except (openai.APIConnectionError, openai.InternalServerError) as e:
+            if attempt == max_retries:
+                raise
+            logger.warning(
+                f"{type(e).__name__} for conversation ID: {m13id}, retrying in {delay}s."
+            )
+            time.sleep(delay)
+            delay *= 2  # Exponential backoff
+            continue
+
+        usage = getattr(completion, "usage", None)
+        _count_usage(usage)
+        if rate_limiter is not None:
+            rate_limiter.on_success(
+                headers,
+                used_tokens=getattr(usage, "total_tokens", None),
+                estimated_tokens=estimated_tokens,
+            )
+        return completion
+
+
+def _count_usage(usage):
+    stage_timer.count("llm_requests")
+    if usage is None:
+        return
+    stage_timer.count("tokens_in", getattr(usage, "prompt_tokens", 0) or 0)
+    stage_timer.count("tokens_out", getattr(usage, "completion_tokens", 0) or 0)
+    # the part of the prompt served from OpenAI's prompt cache
+    details = getattr(usage, "prompt_tokens_details", None)
+    stage_timer.count("tokens_cached", getattr(details, "cached_tokens", 0) or 0)
+
+
+def _rate_limit_slot(estimated_tokens):
+    if rate_limiter is None:
+        return nullcontext()
+    return rate_limiter.acquire(estimated_tokens)
+
+
+# returns the completion and the response headers, which carry the rate limits
+def _send_completion(request):
+    completions = client_openai.chat.completions
+    raw_completions = getattr(completions, "with_raw_response", None)
+    if raw_completions is None:  # a stand-in client without raw responses
+        return completions.create(**request), {}
+    response = raw_completions.create(**request)
+    return response.parse(), response.headers
 
 
 def prompt_summary(text, m13id):
+    cache_key = _summary_cache_key(text)
+    cached_output = _get_cached_output(cache_key, m13id)
+    if cached_output is not None:
+        return cached_output
+
+    completion = _create_completion(m13id, **_summary_request(text))
+    output = completion.choices[0].message.content
+    logger.debug(output)
+    _set_cached_output(cache_key, output)
+    return output
+
+
+def _summary_cache_key(text):
+    return LLMCache.make_key(MODEL, SUMMARY_PROMPT_VERSION, text)
+
+
+def _summary_request(text):
     prompt = [
         {
             "role": "user",
@@ -253,39 +471,80 @@ def prompt_summary(text, m13id):
     """,
         }
     ]
-    completion = client_openai.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=prompt,
-    )
-    output = completion.choices[0].message.content
-    logger.debug(output)
+    return {"model": MODEL, "messages": prompt}
+
+
+def _get_cached_output(cache_key, m13id):
+    if llm_cache is None:
+        return None
+    output = llm_cache.get(cache_key)
+    if output is not None:
+        logger.debug(f"Using the cached LLM response for conversation ID: {m13id}")
+        stage_timer.count("llm_cache_hits")
+    else:
+        stage_timer.count("llm_cache_misses")
     return output
 
 
-# This function cleans the HTML formatting and anonymize the text
-def anonymize_and_clean(file_path: str, m13id: str):
-    load_dotenv()
-    db_config = {
-        "host": os.getenv("DB_HOST"),
-        "user": os.getenv("DB_USER"),
-        "password": os.getenv("DB_PASSWORD"),
-        "database": os.getenv("DB_NAME"),
-        "port": os.getenv("DB_PORT"),
-    }
-
-    # get the contact's name from database
-    db_manager = DatabaseManager(db_config=db_config)
+def _set_cached_output(cache_key, output):
+    if llm_cache is not None:
+        llm_cache.set(cache_key, output)
+
+
+# This function gets the contact's name of one m13id from the database. The
+# connection comes from the process-wide pool, so this is cheap per file.
+def fetch_name(m13id: str):
+    db_manager = DatabaseManager(
+        db_config=load_db_config(), pool_size=load_pool_size()
+    )
     db_manager.connect()
-    name_df = db_manager.fetch_name_by_m13(m13id=m13id)
-    name = name_df.to_string(index=False, header=False)
+    try:
+        name_df = db_manager.fetch_name_by_m13(m13id=m13id)
+    finally:
+        db_manager.disconnect()
+    return name_df.to_string(index=False, header=False)
+
+
+# This function fetches the display names of all m13ids in one go, returns None
+# if the database is unavailable (the names are then looked up per file)
+def prefetch_names(m13ids):
+    db_manager = DatabaseManager(
+        db_config=load_db_config(), pool_size=load_pool_size()
+    )
+    db_manager.connect()
+    try:
+        names = db_manager.fetch_names_by_m13_list(m13ids)
+    except ConnectionError as e:
+        logger.warning(f"Could not prefetch contact names: {e}")
+        return None
+    finally:
+        db_manager.disconnect()
+    if len(names) < len(set(m13ids)):
+        logger.warning(
+            f"Prefetched {len(names)}/{len(m13ids)} contact names, "
+            "the others are looked up per file."
+        )
+    else:
+        logger.info(f"Prefetched {len(names)}/{len(m13ids)} contact names.")
+    return names
+
 
-    with open(file_path, "r") as file:
-        conversation = file.read()
+# This function cleans the HTML formatting and anonymize the text. The contact's
+# name is looked up in the database unless it was prefetched.
+def anonymize_and_clean(file_path: str, m13id: str, name: str = None):
+    if name is None:
+        with stage_timer.time("db_lookup"):
+            name = fetch_name(m13id)
+
+    with stage_timer.time("read"):
+        with open(file_path, "r") as file:
+            conversation = file.read()
+    with stage_timer.time("clean_html"):
         conversation = utility.clean_html_styling(conversation)
+    with stage_timer.time("anonymize"):
         clean_conversation, original_name, original_phone = anonymize(
             conversation, name
         )
-    db_manager.disconnect()
     # Dump the clean conversation
     with open(f"test-dump-2/{m13id}_clean.txt", "w") as f:
         f.write(clean_conversation)
@@ -293,58 +552,377 @@ def anonymize_and_clean(file_path: str, m13id: str):
     return clean_conversation, original_name, original_phone
 
 
-def main(folder_path: str, excel_file: str):
-    total_files = len([f for f in os.listdir(folder_path) if f.endswith(".txt")])
+# This function runs one conversation file through the whole pipeline and returns
+# (m13id, contact, output). It is safe to run in a worker thread. With
+# init_level=False the address of the contact is left for enrichment.enrich_contacts.
+def process_file(
+    file_path: str,
+    name: str = None,
+    manifest: RunManifest = None,
+    init_level: bool = True,
+):
+    m13id = utility.get_file_id(file_path)
+    cleaned_text, original_name, original_phone = anonymize_and_clean(
+        file_path, m13id, name=name
+    )
+    _record_stage(manifest, m13id, Stage.CLEANED)
+    return prompt_and_parse(
+        m13id, cleaned_text, original_name, original_phone, manifest, init_level
+    )
+
+
+# The second half of process_file: the LLM requests and the parsing of a cleaned
+# conversation, returns (m13id, contact, output)
+def prompt_and_parse(
+    m13id: str,
+    cleaned_text: str,
+    original_name: str,
+    original_phone,
+    manifest: RunManifest = None,
+    init_level: bool = True,
+):
+    with stage_timer.time("llm"):
+        output = prompt_openai(cleaned_text, m13id)
+    if output is not None:
+        _record_stage(manifest, m13id, Stage.PROMPTED)
+    contact, output = _output_to_contact(
+        m13id, output, original_name, original_phone, manifest, init_level=init_level
+    )
+    if contact is not None and summary_mode == SummaryMode.SEPARATE:
+        try:
+            with stage_timer.time("llm_summary"):
+                contact.conversation_summary = prompt_summary(cleaned_text, m13id)
+        except Exception as e:
+            logger.error(f"Could not summarize conversation ID: {m13id}. Error: {e}")
+    return m13id, contact, output
+
+
+# The headers of the output workbook and the row of a contact, with the summary
+# column when a summary is requested
+def _excel_headers():
+    if summary_mode == SummaryMode.OFF:
+        return utility.EXCEL_HEADERS
+    return utility.EXCEL_HEADERS + [utility.SUMMARY_HEADER]
+
+
+def _contact_row(contact, row=None):
+    if row is None:
+        row = utility.contact_to_row(contact)
+    if summary_mode != SummaryMode.OFF:
+        row.append(str(contact.conversation_summary))
+    return row
+
+
+# This function enriches the addresses of a batch of (m13id, contact) in one pass
+# and writes their rows, then empties the batch. enrich returns the rows of the
+# contacts, e.g. by running enrichment.enrich_contacts in a worker process.
+def _write_contacts(writer, contacts, enrich=enrichment.enrich_contacts):
+    if not contacts:
+        return
+    with stage_timer.time("enrich"):
+        rows = enrich([contact for _, contact in contacts])
+    with stage_timer.time("excel_write"):
+        for (m13id, contact), row in zip(contacts, rows):
+            writer.append(_contact_row(contact, row), key=m13id)
+    contacts.clear()
+
+
+# This function parses the LLM output of one conversation into a Contact (None if
+# the output is invalid) and restores the anonymized name and phone number
+def _output_to_contact(
+    m13id, output, original_name, original_phone, manifest=None, init_level=True
+):
+    with stage_timer.time("parse"):
+        output = utility.clean_json(input_string=output)
+        contact = utility.parse_json_to_contact(json_data=output)
+
+    # prevent exceptions in the next block if contact is None
+    if contact is not None:
+        _record_stage(manifest, m13id, Stage.PARSED)
+        contact.id = m13id  # IMPORTANT
+        if init_level:
+            with stage_timer.time("init_level"):
+                contact.init_level()  # IMPORTANT: Initialize level
+        if contact.name == NAME_PLACEHOLDER:
+            logger.debug(f"Changed {contact.name} into {original_name}")
+            contact.name = original_name
+        if contact.phone_number == PHONE_PLACEHOLDER:
+            logger.debug(f"Changed {contact.phone_number} into {original_phone}")
+            contact.phone_number = original_phone
+
+    # LOG - output json dump into a txt file
+    dumpfile = f"test-output-dump/{m13id}-dump.txt"
+    with open(dumpfile, "w") as f:
+        f.write(output)
+
+    return contact, output
+
+
+def _record_stage(manifest, m13id, stage, error=None):
+    if manifest is not None:
+        manifest.record(m13id, stage, error=error)
+
+
+# Wraps prompt_and_parse so that one failing file does not cancel the whole batch
+def _prompt_and_parse_safe(m13id, cleaned, manifest):
+    try:
+        return prompt_and_parse(m13id, *cleaned, manifest=manifest, init_level=False)
+    except Exception as e:
+        logger.error(f"Error processing ID '{m13id}': {e}")
+        _record_stage(manifest, m13id, Stage.FAILED, error=e)
+        return None
+
+
+# Wraps process_file so that one failing file does not cancel the whole batch
+def _process_file_safe(
+    file_path: str,
+    name: str = None,
+    manifest: RunManifest = None,
+    init_level: bool = True,
+):
+    try:
+        return process_file(
+            file_path, name=name, manifest=manifest, init_level=init_level
+        )
+    except Exception as e:
+        # TODO: give more explanation about the exception
+        logger.error(f"Error processing file {os.path.basename(file_path)}: {e}")
+        _record_stage(manifest, utility.get_file_id(file_path), Stage.FAILED, error=e)
+        return None
+
+
+# The CPU stages (cleaning, anonymizing and enrichment) can run in a process pool
+# instead of the worker threads, see main. Every worker process gets the
+# gazetteer once, when it starts, and builds its indexes before the first file.
+def _init_cpu_worker(shared_gazetteer):
+    gazetteer._gazetteer = shared_gazetteer
+    get_district_index()
+    get_address_resolver()
+
+
+# Runs anonymize_and_clean in a worker process, returns the result (None if it
+# failed), the error and the stage timings of the worker
+def _clean_in_worker(file_path: str, m13id: str, name: str = None):
+    stage_timer.reset()
+    try:
+        result, error = anonymize_and_clean(file_path, m13id, name=name), None
+    except Exception as e:
+        # the message only, the exception itself may not survive pickling
+        result, error = None, str(e)
+    return result, error, stage_timer.snapshot()
+
+
+def _enrich_in_worker(contacts):
+    return enrichment.enrich_contacts(contacts)
+
+
+def _enrich_in_pool(cpu_executor, contacts):
+    return cpu_executor.submit(_enrich_in_worker, contacts).result()
+
+
+def _cpu_executor(process_workers):
+    if process_workers <= 0:
+        return nullcontext()
+    return ProcessPoolExecutor(
+        max_workers=process_workers,
+        initializer=_init_cpu_worker,
+        initargs=(gazetteer.get_gazetteer(),),
+    )
+
+
+# Like executor.map, but with at most max_pending calls submitted and not yet
+# consumed, so that an error or Ctrl-C while the results are consumed does not
+# leave every remaining file queued with its (billed) OpenAI requests
+def _bounded_map(executor, fn, *iterables, max_pending):
+    futures = deque()
+    for args in zip(*iterables):
+        if len(futures) >= max_pending:
+            yield futures.popleft().result()
+        futures.append(executor.submit(fn, *args))
+    while futures:
+        yield futures.popleft().result()
+
+
+# This generator runs the files through the pipeline with the CPU stages in a
+# process pool: the conversations are cleaned by the worker processes, and each
+# cleaned conversation goes to the thread pool for the LLM requests, at most
+# max_pending at a time. Only a few files per process are queued for cleaning,
+# so that an enrich batch submitted to the same pool does not wait for the rest
+# of the folder. Yields (m13id, contact, output) in file order, leaving out the
+# failed files.
+def _process_pool_results(
+    executor,
+    cpu_executor,
+    cpu_workers,
+    file_paths,
+    m13ids,
+    contact_names,
+    manifest,
+    max_pending,
+):
+    cleaned_files = _bounded_map(
+        cpu_executor,
+        _clean_in_worker,
+        file_paths,
+        m13ids,
+        contact_names,
+        max_pending=2 * cpu_workers,
+    )
+    futures = deque()
+    for file_path, m13id, (cleaned, error, timings) in zip(
+        file_paths, m13ids, cleaned_files
+    ):
+        stage_timer.merge(timings)
+        if cleaned is None:
+            logger.error(
+                f"Error processing file {os.path.basename(file_path)}: {error}"
+            )
+            _record_stage(manifest, m13id, Stage.FAILED, error=error)
+            continue
+        _record_stage(manifest, m13id, Stage.CLEANED)
+        if len(futures) >= max_pending:
+            yield futures.popleft().result()
+        futures.append(
+            executor.submit(_prompt_and_parse_safe, m13id, cleaned, manifest)
+        )
+        # hand over the results that are already done while cleaning continues
+        while futures and futures[0].done():
+            yield futures.popleft().result()
+    while futures:
+        yield futures.popleft().result()
+
+
+# This function lists the conversation files of a folder (sorted, so that the
+# rows in the output workbook have a deterministic order) and returns the paths
+# and m13ids of those not yet written according to the manifest
+def _pending_files(folder_path: str, manifest: RunManifest):
+    file_names = sorted(f for f in os.listdir(folder_path) if f.endswith(".txt"))
+    file_paths = [os.path.join(folder_path, file_name) for file_name in file_names]
+
+    m13ids = [utility.get_file_id(file_path) for file_path in file_paths]
+
+    pending = [
+        (file_path, m13id)
+        for file_path, m13id in zip(file_paths, m13ids)
+        if not manifest.is_written(m13id)
+    ]
+    if len(pending) < len(file_paths):
+        logger.info(
+            f"Skipping {len(file_paths) - len(pending)} files that were written in a previous run."
+        )
+    file_paths = [file_path for file_path, _ in pending]
+    m13ids = [m13id for _, m13id in pending]
+    return file_paths, m13ids
+
+
+# resolve every contact name with a few bulk queries instead of one per file,
+# None means the name is looked up when the file is processed. That is also the
+# case for the m13ids the prefetch did not return: the query of their chunk may
+# have failed, and without a name the contact would not be anonymized.
+def _contact_names(m13ids):
+    with stage_timer.time("db_prefetch"):
+        names = prefetch_names(m13ids)
+    if names is None:
+        return [None] * len(m13ids)
+    return [names.get(m13id) for m13id in m13ids]
+
+
+def _open_manifest(excel_file: str):
+    # The manifest next to the output workbook records which m13ids were already
+    # written, so a restarted run only processes the remaining (or failed) files
+    return RunManifest(f"{os.path.splitext(excel_file)[0]}.manifest.jsonl")
+
+
+def main(
+    folder_path: str,
+    excel_file: str,
+    max_workers: int = 1,
+    excel_batch_size: int = 50,
+    process_workers: int = 0,
+):
+    stage_timer.reset()
+    manifest = _open_manifest(excel_file)
+    file_paths, m13ids = _pending_files(folder_path, manifest)
+
+    total_files = len(file_paths)
     processed_files = 0
     skipped_ids = []
 
-    # process one folder
-    for file_name in os.listdir(folder_path):
-        if file_name.endswith(".txt"):
-            try:
-                file_path = os.path.join(folder_path, file_name)
-                m13id = utility.get_file_id(file_path)
-                cleaned_text, original_name, original_phone = anonymize_and_clean(
-                    file_path, m13id
-                )
+    contact_names = _contact_names(m13ids)
+
+    # an m13id only counts as written once its row is saved to disk
+    def mark_written(written_ids):
+        for m13id in written_ids:
+            manifest.record(m13id, Stage.WRITTEN)
+
+    # process one folder. The OpenAI calls run concurrently in a bounded worker
+    # pool, the results are consumed in file order and enriched and written in
+    # batches of excel_batch_size contacts. With process_workers the CPU stages
+    # run in a pool of that many processes, started before the worker threads
+    # since forking a process that runs threads is unsafe. Only a few files per
+    # worker thread are submitted ahead of the one being written.
+    contacts = []
+    max_pending = 2 * max(1, max_workers)
+    with manifest, ExcelWriter(
+        excel_file,
+        _excel_headers(),
+        batch_size=excel_batch_size,
+        check_headers=True,
+        on_flush=mark_written,
+    ) as writer, _cpu_executor(process_workers) as cpu_executor, ThreadPoolExecutor(
+        max_workers=max(1, max_workers)
+    ) as executor:
+        if cpu_executor is None:
+            results = _bounded_map(
+                executor,
+                partial(_process_file_safe, manifest=manifest, init_level=False),
+                file_paths,
+                contact_names,
+                max_pending=max_pending,
+            )
+            enrich = enrichment.enrich_contacts
+        else:
+            results = _process_pool_results(
+                executor,
+                cpu_executor,
+                process_workers,
+                file_paths,
+                m13ids,
+                contact_names,
+                manifest,
+                max_pending,
+            )
+            enrich = partial(_enrich_in_pool, cpu_executor)
 
-                output = prompt_openai(cleaned_text, m13id)
-                output = utility.clean_json(input_string=output)
-                contact = utility.parse_json_to_contact(json_data=output)
+        try:
+            for result in results:
+                if result is None:
+                    continue
+                m13id, contact, output = result
 
-                # prevent exceptions in the next block if contact is None
                 if contact is not None:
-                    contact.id = m13id  # IMPORTANT
-                    contact.init_level()  # IMPORTANT: Initialize level
-                    if contact.name == NAME_PLACEHOLDER:
-                        logger.debug(f"Changed {contact.name} into {original_name}")
-                        contact.name = original_name
-                    if contact.phone_number == PHONE_PLACEHOLDER:
-                        logger.debug(
-                            f"Changed {contact.phone_number} into {original_phone}"
-                        )
-                        contact.phone_number = original_phone
                     # parse contact and output it in excel
-                    success = utility.contact_to_excel(contact, excel_file)
-
+                    contacts.append((m13id, contact))
+                    if len(contacts) >= excel_batch_size:
+                        _write_contacts(writer, contacts, enrich)
                 else:
                     logger.error(
                         f"Contact is None. Appending ID '{m13id}' to the skipped_id list."
                     )
                     skipped_ids.append(m13id)
-
-                # LOG - output json dump into a txt file
-                dumpfile = f"test-output-dump/{m13id}-dump.txt"
-                with open(dumpfile, "w") as f:
-                    f.write(output)
+                    manifest.record(m13id, Stage.FAILED, error="Contact is None")
 
                 # increment the counter and log the progress
                 processed_files += 1
                 logger.info(f"Processed {processed_files}/{total_files} files.")
-
-            except Exception as e:
-                # TODO: give more explanation about the exception
-                logger.error(f"Error processing file {file_name}: {e}")
+            _write_contacts(writer, contacts, enrich)
+        except BaseException:
+            # on Ctrl-C or an error while writing, drop the queued files instead
+            # of waiting for them (and paying for their requests) on exit
+            executor.shutdown(wait=False, cancel_futures=True)
+            if cpu_executor is not None:
+                cpu_executor.shutdown(wait=False, cancel_futures=True)
+            raise
 
     # finally
     if skipped_ids:
@@ -355,10 +933,192 @@ def main(folder_path: str, excel_file: str):
         logger.info(
             f"Successfully processed all files in the folder."
         )  # see if this works lol
+    _log_stage_summary(processed_files)
+
+
+# Batch mode for bulk folders: all conversations are cleaned first, the requests
+# that are not cached go to the OpenAI Batch API in one go, and the results are
+# parsed and written once the batch is done. The submitted batches are saved next
+# to the output workbook until their results are cached, so a restarted run
+# resumes them. The client can be replaced by a fake with the same files/batches
+# interface to run this offline.
+def main_batch(
+    folder_path: str,
+    excel_file: str,
+    excel_batch_size: int = 50,
+    poll_interval: float = 60,
+    client=None,
+):
+    client = client or client_openai
+    stage_timer.reset()
+    manifest = _open_manifest(excel_file)
+    file_paths, m13ids = _pending_files(folder_path, manifest)
+    contact_names = _contact_names(m13ids)
+
+    def mark_written(written_ids):
+        for m13id in written_ids:
+            manifest.record(m13id, Stage.WRITTEN)
+
+    # opened first, so that resuming into a workbook with other headers (e.g. of
+    # another SUMMARY_MODE) fails before the batch is sent
+    writer = ExcelWriter(
+        excel_file,
+        _excel_headers(),
+        batch_size=excel_batch_size,
+        check_headers=True,
+        on_flush=mark_written,
+    )
+    writer.open()
+
+    # the results of the batches by cache key, kept here as well for when there
+    # is no cache
+    batch_outputs = {}
+
+    def cache_results(results, keys):
+        for custom_id, output in results.items():
+            batch_outputs[keys[custom_id]] = output
+            _set_cached_output(keys[custom_id], output)
+
+    def get_output(cache_key, m13id):
+        output = batch_outputs.get(cache_key)
+        if output is None:
+            output = _get_cached_output(cache_key, m13id)
+        return output
+
+    # the batches of a previous run that was stopped before they were done
+    batch_state = batchrunner.BatchState(
+        f"{os.path.splitext(excel_file)[0]}.batches.json"
+    )
+    if batch_state.batches:
+        logger.info(f"Resuming {len(batch_state.batches)} batches of a previous run.")
+        with stage_timer.time("llm_batch"):
+            batchrunner.wait_for_batches(
+                client, batch_state, poll_interval, on_results=cache_results
+            )
+
+    conversations = []  # (m13id, original name, original phone, custom ids)
+    outputs = {}  # custom id -> LLM output
+    requests = []  # (custom id, request body) of the outputs not in the cache
+    cache_keys = {}  # custom id -> cache key
+    for file_path, m13id, name in zip(file_paths, m13ids, contact_names):
+        try:
+            text, original_name, original_phone = anonymize_and_clean(
+                file_path, m13id, name=name
+            )
+        except Exception as e:
+            logger.error(f"Error processing file {os.path.basename(file_path)}: {e}")
+            manifest.record(m13id, Stage.FAILED, error=e)
+            continue
+        manifest.record(m13id, Stage.CLEANED)
+
+        if chunking.count_tokens(text, MODEL) > max_conversation_tokens:
+            chunks = chunking.split_into_chunks(text, max_conversation_tokens, MODEL)
+            parts = [
+                (chunk, (part, len(chunks)))
+                for part, chunk in enumerate(chunks, start=1)
+            ]
+        else:
+            parts = [(text, None)]
+
+        custom_ids = []
+        for chunk, part in parts:
+            custom_id = m13id if part is None else f"{m13id}#{part[0]}/{part[1]}"
+            custom_ids.append(custom_id)
+            cache_keys[custom_id] = _extraction_cache_key(chunk, part)
+            cached_output = get_output(cache_keys[custom_id], m13id)
+            if cached_output is not None:
+                outputs[custom_id] = cached_output
+            else:
+                requests.append((custom_id, _extraction_request(chunk, part)))
+        if summary_mode == SummaryMode.SEPARATE:
+            custom_id = f"{m13id}#summary"
+            cache_keys[custom_id] = _summary_cache_key(text)
+            cached_output = get_output(cache_keys[custom_id], m13id)
+            if cached_output is not None:
+                outputs[custom_id] = cached_output
+            else:
+                requests.append((custom_id, _summary_request(text)))
+        conversations.append((m13id, original_name, original_phone, custom_ids))
+
+    if requests:
+        logger.info(f"Sending {len(requests)} requests to the Batch API.")
+        # each batch is cached as soon as it is done, so a crash or a failed
+        # batch does not lose the results of the others
+        with stage_timer.time("llm_batch"):
+            batchrunner.run_batch(
+                client,
+                requests,
+                f"{os.path.splitext(excel_file)[0]}.batch.jsonl",
+                batch_state,
+                keys=cache_keys,
+                poll_interval=poll_interval,
+                on_results=cache_results,
+            )
+        for custom_id, _ in requests:
+            if cache_keys[custom_id] in batch_outputs:
+                outputs[custom_id] = batch_outputs[cache_keys[custom_id]]
+
+    skipped_ids = []
+    contacts = []  # parsed, enriched and written all at once at the end
+
+    with manifest, writer:
+        for m13id, original_name, original_phone, custom_ids in conversations:
+            if len(custom_ids) == 1:
+                output = outputs.get(custom_ids[0])
+            else:
+                output = _merge_part_outputs(
+                    [outputs.get(custom_id) for custom_id in custom_ids], m13id
+                )
+            if output is None:
+                logger.error(f"No batch result for ID '{m13id}'.")
+                skipped_ids.append(m13id)
+                manifest.record(m13id, Stage.FAILED, error="No batch result")
+                continue
+            manifest.record(m13id, Stage.PROMPTED)
+
+            try:
+                contact, output = _output_to_contact(
+                    m13id,
+                    output,
+                    original_name,
+                    original_phone,
+                    manifest,
+                    init_level=False,
+                )
+            except Exception as e:
+                logger.error(f"Error processing the output of ID '{m13id}': {e}")
+                contact = None
+            if contact is not None:
+                if summary_mode == SummaryMode.SEPARATE:
+                    contact.conversation_summary = outputs.get(f"{m13id}#summary", "")
+                contacts.append((m13id, contact))
+            else:
+                skipped_ids.append(m13id)
+                manifest.record(m13id, Stage.FAILED, error="Contact is None")
+        _write_contacts(writer, contacts)
+
+    if skipped_ids:
+        logger.warning(
+            f"Processed {len(file_paths)} files. Skipped {len(skipped_ids)} files with IDs: {', '.join(skipped_ids)}"
+        )
+    else:
+        logger.info("Successfully processed all files in the folder.")
+    _log_stage_summary(len(conversations))
+
+
+def _log_stage_summary(processed_files):
+    wall_time = time.monotonic() - stage_timer.started
+    logger.info(
+        f"Processed {processed_files} files in {wall_time:.1f}s "
+        f"({processed_files / wall_time if wall_time else 0:.2f} files/s). "
+        f"Stage timings:\n{stage_timer.format_table()}"
+    )
 
 
 if __name__ == "__main__":
-    client_openai = openai.OpenAI()
+    load_dotenv()
+    # the retries of rate limited requests are done by _create_completion
+    client_openai = openai.OpenAI(max_retries=0)
     openai.api_key = os.environ["OPENAI_API_KEY"]
     setup_logging()
     logger = logging.getLogger(__name__)
@@ -366,5 +1126,68 @@ if __name__ == "__main__":
     folder_path = input("Please enter folder path: ")
     excel_file = input("Please enter excel file for the output: ")
     excel_file = utility.validate_excel(filename=excel_file)
+    # number of conversations processed concurrently (1 = sequential)
+    max_workers = int(os.getenv("MAX_WORKERS", "1"))
+    # number of processes for cleaning, anonymizing and enrichment (0 = in the
+    # worker threads)
+    process_workers = int(os.getenv("PROCESS_WORKERS", "0"))
+    # number of rows written between two saves of the output workbook
+    excel_batch_size = int(os.getenv("EXCEL_BATCH_SIZE", "50"))
+
+    # use | refresh (ignore cached responses) | bypass (no cache at all)
+    llm_cache = LLMCache(
+        path=os.getenv("LLM_CACHE_FILE", "llm_cache.sqlite"),
+        mode=os.getenv("LLM_CACHE", "use"),
+        max_age_days=float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "30")),
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "100000")),
+    )
+
+    # off | separate | combined, see summary_mode
+    summary_mode = os.getenv("SUMMARY_MODE", SummaryMode.OFF)
+    if summary_mode not in (
+        SummaryMode.OFF,
+        SummaryMode.SEPARATE,
+        SummaryMode.COMBINED,
+    ):
+        raise ValueError(f"Invalid summary mode provided: {summary_mode}.")
+
+    # requests/minute and tokens/minute of the account (unset: learned from the
+    # rate limit headers of the responses)
+    rate_limiter = RateLimiter(
+        requests_per_minute=int(os.getenv("OPENAI_RPM", "0")),
+        tokens_per_minute=int(os.getenv("OPENAI_TPM", "0")),
+        max_concurrency=max_workers,
+    )
+    max_retries = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+
+    # full (the original prompt) | lean (static system prompt, compact schema)
+    lean_extraction = os.getenv("EXTRACTION_PROMPT", "full") == "lean"
+    # keep the reasoning and confidence of every field in the lean schema
+    extraction_audit = os.getenv("EXTRACTION_AUDIT", "0") == "1"
+
+    # conversations over this many tokens are extracted in chunks
+    max_conversation_tokens = int(os.getenv("MAX_CONVERSATION_TOKENS", "100000"))
+
+    # 1 = send the whole folder to the Batch API instead of one request per file
+    if os.getenv("OPENAI_BATCH", "0") == "1":
+        main_batch(
+            folder_path,
+            excel_file,
+            excel_batch_size=excel_batch_size,
+            poll_interval=float(os.getenv("BATCH_POLL_INTERVAL", "60")),
+        )
+    else:
+        main(
+            folder_path,
+            excel_file,
+            max_workers=max_workers,
+            excel_batch_size=excel_batch_size,
+            process_workers=process_workers,
+        )
 
-    main(folder_path, excel_file)
+    # optional machine-readable stage metrics, e.g. metrics.json and a .prom file
+    # for the textfile collector of the Prometheus node exporter
+    if os.getenv("STAGE_METRICS_JSON"):
+        stage_timer.write_json(os.environ["STAGE_METRICS_JSON"])
+    if os.getenv("STAGE_METRICS_PROM"):
+        stage_timer.write_prometheus(os.environ["STAGE_METRICS_PROM"])
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import inquirer
 import logging
@@ -93,76 +94,147 @@ def get_user_selection(headers):
     return answers["headers"]
 
 
-# Function to compare columns
-def compare_columns(df1, df2, headers):
-    accuracy_per_category = {}
+# Vectorized versions of the normalizers above, they take and return a whole
+# column. Values are compared as strings, like str(value) in the normalizers.
+def _as_str(column):
+    # .map(str) and not .astype(str), which keeps NaN as NaN in newer pandas
+    return column.map(str)
 
-    # Compare row by row, column by column
-    for header in headers:
-        differences = 0
-        total_comparisons = 0
-
-        if header in df1.columns and header in df2.columns:
-            for idx, (id1, id2, value1, value2) in enumerate(
-                zip(df1["M13 ID"], df2["M13 ID"], df1[header], df2[header]), start=1
-            ):
-                # Normalize phone numbers if the column is 'handphone'
-                if header.lower() == "handphone":
-                    value1 = normalize_phone_number(value1)
-                    value2 = normalize_phone_number(value2)
-
-                if header.lower() == "persona":
-                    value1 = normalize_persona(value1)
-                    value2 = normalize_persona(value2)
-
-                if header.lower() == "education":
-                    value1 = normalize_education(value1)
-                    value2 = normalize_education(value2)
-
-                if header.lower() == "marriage":
-                    value1 = normalize_marriage(value1)
-                    value2 = normalize_marriage(value2)
-
-                if header.lower() == "attitude":
-                    value1 = normalize_attitude(value1)
-                    value2 = normalize_attitude(value2)
-
-                if header.lower() == "level":
-                    value1 = normalize_level(value1)
-                    value2 = normalize_level(value2)
-
-                if header.lower() == "gender":
-                    value1 = normalize_gender(value1)
-                    value2 = normalize_gender(value2)
-
-                # logging.debug(f"Inference: {value1}, Control: {value2}")
-
-                # Increment the total comparisons counter
-                total_comparisons += 1
-
-                if (
-                    (str(value1).lower() == str(value2).lower())
-                    or (str(value1).lower() in str(value2).lower())
-                    or (str(value2).lower() in str(value1).lower())
-                ):
-                    continue
-                else:
-                    logging.info(
-                        f"Difference in {header} on file {id1} {id2} Inference: '{value1}' != Control: '{value2}'"
-                    )
-                    differences += 1
 
-        else:
-            logging.error(f"Column '{header}' is not found in one of the DataFrames")
+def normalize_gender_column(column):
+    lowered = _as_str(column).str.lower()
+    return column.mask(lowered == "perempuan", "Wanita (Female)").mask(
+        lowered == "laki-laki", "Pria (Male)"
+    )
 
-        # Store the accuracy for this category
-        if total_comparisons > 0:
-            accuracy_per_category[header] = (
-                total_comparisons - differences
-            ) / total_comparisons
-        else:
+
+def normalize_level_column(column):
+    upper = _as_str(column).str.upper()
+    return column.mask(upper == "KABUPATEN", "Kab.").mask(upper == "KOTA", "Kota")
+
+
+def normalize_attitude_column(column):
+    return column.mask(_as_str(column).str.lower() == "open", "Open (Terbuka)")
+
+
+def normalize_phone_number_column(column):
+    phone = _as_str(column).str.replace(r"\D", "", regex=True)
+    phone = phone.mask(phone.str.startswith("0"), "62" + phone.str[1:])
+    phone = phone.mask(phone.str.startswith("8"), "62" + phone)
+    return phone.mask(phone == "", "Not a phone number")
+
+
+def normalize_persona_column(column):
+    return _as_str(column).str.replace("/", "&", regex=False).str.split(" ").str[0]
+
+
+def normalize_education_column(column):
+    column = column.mask(column.isna() | (column == "Tidak Dikenal"), "Tidak Diketahui")
+    return column.mask(_as_str(column).str.contains("SMA", regex=False), "SMA")
+
+
+def normalize_marriage_column(column):
+    lowered = _as_str(column).str.lower()
+    lowered = lowered.replace(
+        {"married": "menikah", "single": "lajang", "cerai": "janda/duda"}
+    )
+    return lowered.mask(lowered.str.contains("widow", regex=False), "janda/duda")
+
+
+# The normalizer of each column, by lowercase header
+COLUMN_NORMALIZERS = {
+    "handphone": normalize_phone_number_column,
+    "persona": normalize_persona_column,
+    "education": normalize_education_column,
+    "marriage": normalize_marriage_column,
+    "attitude": normalize_attitude_column,
+    "level": normalize_level_column,
+    "gender": normalize_gender_column,
+}
+
+
+def _normalized_values(column, normalize):
+    """The normalized string of every value of a column, as an array.
+
+    The columns have few distinct values, so only these are normalized. NaN is
+    kept apart from the string "nan" since the normalizers treat them differently.
+    """
+    keys = _as_str(column)
+    codes, _ = pd.factorize(keys.mask(column.isna(), "\0" + keys))
+    _, first_rows = np.unique(codes, return_index=True)
+    uniques = column.iloc[first_rows].reset_index(drop=True)
+    if normalize is not None:
+        uniques = normalize(uniques)
+    return _as_str(uniques).to_numpy()[codes]
+
+
+def _matching(values1, values2):
+    """Whether two string arrays match row by row, case-insensitively equal or
+    one containing the other, checking every distinct pair of values once."""
+    codes1, uniques1 = pd.factorize(values1)
+    codes2, uniques2 = pd.factorize(values2)
+    pairs, pair_rows = np.unique(
+        codes1.astype(np.int64) * len(uniques2) + codes2, return_inverse=True
+    )
+    lowered1 = [value.lower() for value in uniques1]
+    lowered2 = [value.lower() for value in uniques2]
+    matches = np.array(
+        [
+            lowered1[pair // len(uniques2)] in lowered2[pair % len(uniques2)]
+            or lowered2[pair % len(uniques2)] in lowered1[pair // len(uniques2)]
+            for pair in pairs
+        ],
+        dtype=bool,
+    )
+    return matches[pair_rows.reshape(-1)]
+
+
+# Compares the columns of the inference (df1) and control (df2) data whole
+# columns at a time, the rows are paired by position. Returns the accuracy of
+# every header (None if it is missing from a DataFrame) and a DataFrame of the
+# mismatching rows of every compared header.
+def compare_frames(df1, df2, headers):
+    rows = min(len(df1), len(df2))
+    df1 = df1.iloc[:rows].reset_index(drop=True)
+    df2 = df2.iloc[:rows].reset_index(drop=True)
+
+    accuracy_per_category = {}
+    mismatches = {}
+    for header in headers:
+        if header not in df1.columns or header not in df2.columns:
+            logging.error(f"Column '{header}' is not found in one of the DataFrames")
+            accuracy_per_category[header] = None
+            continue
+        if rows == 0:
             accuracy_per_category[header] = None  # No comparisons made for this header
+            continue
+
+        normalize = COLUMN_NORMALIZERS.get(header.lower())
+        values1 = _normalized_values(df1[header], normalize)
+        values2 = _normalized_values(df2[header], normalize)
+
+        matching = _matching(values1, values2)
+        accuracy_per_category[header] = matching.sum() / rows
+        mismatches[header] = pd.DataFrame(
+            {
+                "Inference ID": df1["M13 ID"],
+                "Control ID": df2["M13 ID"],
+                "Inference": values1,
+                "Control": values2,
+            }
+        )[~matching]
 
+    return accuracy_per_category, mismatches
+
+
+# Function to compare columns
+def compare_columns(df1, df2, headers):
+    accuracy_per_category, mismatches = compare_frames(df1, df2, headers)
+    for header, mismatch_df in mismatches.items():
+        for id1, id2, value1, value2 in mismatch_df.itertuples(index=False):
+            logging.info(
+                f"Difference in {header} on file {id1} {id2} Inference: '{value1}' != Control: '{value2}'"
+            )
     return accuracy_per_category
 
 
@@ -186,15 +258,27 @@ def main(args):
 
     # Compare the data
     logging.info("Comparing selected columns...")
-    accuracy_per_category = compare_columns(inference_df, control_df, selected_headers)
+    accuracy_per_category, mismatches = compare_frames(
+        inference_df, control_df, selected_headers
+    )
 
     # Log accuracy for each category
     for category, accuracy in accuracy_per_category.items():
         if accuracy is not None:
-            logging.info(f"Accuracy for {category}: {accuracy:.2%}")
+            logging.info(
+                f"Accuracy for {category}: {accuracy:.2%} "
+                f"({len(mismatches[category])} differences)"
+            )
         else:
             logging.warning(f"No comparisons made for {category}.")
 
+    # Write the differences, one sheet per category
+    if args.mismatches:
+        with pd.ExcelWriter(args.mismatches) as writer:
+            for category, mismatch_df in mismatches.items():
+                mismatch_df.to_excel(writer, sheet_name=category[:31], index=False)
+        logging.info(f"Differences written to {args.mismatches}")
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -207,5 +291,10 @@ if __name__ == "__main__":
         help="Excel sheet of inference result data",
         required=True,
     )
+    parser.add_argument(
+        "--mismatches",
+        type=str,
+        help="Excel file to write the differences of every category to",
+    )
     args = parser.parse_args()
     main(args)
@@ -17,3 +17,29 @@ class QueryExecutor:
         except Exception as e:
             print(f"Error executing query: {e}")
             return pd.DataFrame()  # Return an empty DataFrame in case of error
+
+    def stream_query(self, query, params=None, chunk_size=1000):
+        """Execute a SQL query on an unbuffered cursor and yield the result as DataFrames of at most chunk_size rows.
+
+        The rows are fetched from the server as they are consumed, so only one chunk is held in memory.
+        """
+        if not self.db_connection.is_connected():
+            raise ConnectionError("Database connection is not established.")
+
+        connection = self.db_connection.connection
+        cursor = connection.cursor(buffered=False)
+        try:
+            cursor.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield pd.DataFrame.from_records(rows, columns=columns)
+        except Exception as e:
+            print(f"Error executing query: {e}")
+        finally:
+            # read away the rows that were not consumed, otherwise the connection
+            # cannot be used for the next query
+            connection.consume_results()
+            cursor.close()
@@ -0,0 +1,223 @@
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# used when a 429 response has neither Retry-After nor rate limit reset headers
+DEFAULT_RETRY_AFTER = 1.0
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value):
+    """Parse a rate limit reset like "1s", "6m0s" or "20ms" into seconds."""
+    if value is None:
+        return None
+    parts = _DURATION_PART.findall(str(value))
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(number) * _DURATION_SECONDS[unit] for number, unit in parts)
+
+
+def retry_after_seconds(headers):
+    """Return how long a rate limited response asks to wait, or None."""
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if retry_after is not None:
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:  # an HTTP date
+                return max(
+                    parsedate_to_datetime(retry_after).timestamp() - time.time(), 0
+                )
+            except (TypeError, ValueError):
+                pass
+    # otherwise wait until the exhausted limit resets
+    resets = []
+    for kind in ("requests", "tokens"):
+        if headers.get(f"x-ratelimit-remaining-{kind}") == "0":
+            resets.append(parse_duration(headers.get(f"x-ratelimit-reset-{kind}")))
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+
+class _TokenBucket:
+    """Budget of `per_minute` units that refills continuously."""
+
+    def __init__(self, per_minute, configured=True):
+        # a configured budget is an upper bound, a budget learned from the
+        # headers follows them
+        self.configured = per_minute if configured else None
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        rate = self.capacity / 60
+        self.level = min(self.capacity, self.level + (now - self.updated) * rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        self._refill(now)
+        # a request larger than the whole budget waits for a full bucket
+        needed = min(amount, self.capacity)
+        if self.level >= needed:
+            return 0
+        return (needed - self.level) / (self.capacity / 60)
+
+    def take(self, amount):
+        # may go below zero, the next requests then wait for the debt to refill
+        self.level -= amount
+
+    def sync(self, limit, remaining, now):
+        """Adopt the limit and remaining budget reported by the API."""
+        self._refill(now)
+        self.capacity = (
+            limit if self.configured is None else min(limit, self.configured)
+        )
+        self.level = min(self.level, remaining)
+
+
+class RateLimiter:
+    """Client-side rate limiter shared by all worker threads.
+
+    Requests wait for a slot in two token buckets, one of requests per minute and
+    one of tokens per minute. A bucket that is not configured is created from the
+    x-ratelimit-limit-* headers of the first response, and both are kept in sync
+    with the x-ratelimit-remaining-* headers. The number of requests in flight is
+    adapted AIMD-style: it grows by about one per round of successful requests up
+    to `max_concurrency`, and halves on every 429, after which all requests also
+    wait for the Retry-After (or reset) time of the response.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        max_concurrency=1,
+        min_concurrency=1,
+    ):
+        self.request_bucket = (
+            _TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.token_bucket = (
+            _TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        )
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.concurrency = float(self.max_concurrency)
+        self.in_flight = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self._blocked_until = 0.0
+        self._condition = threading.Condition()
+
+    def _costs(self, tokens):
+        return [
+            (bucket, amount)
+            for bucket, amount in (
+                (self.request_bucket, 1),
+                (self.token_bucket, tokens),
+            )
+            if bucket is not None
+        ]
+
+    def _wait_time(self, tokens, now):
+        # None means until a request in flight finishes
+        if self._blocked_until > now:
+            return self._blocked_until - now
+        if self.in_flight >= int(self.concurrency):
+            return None
+        return max(
+            (bucket.wait_time(amount, now) for bucket, amount in self._costs(tokens)),
+            default=0,
+        )
+
+    @contextmanager
+    def acquire(self, tokens=0):
+        """Wait until a request of `tokens` tokens may be sent, for a `with` block."""
+        with self._condition:
+            while True:
+                wait = self._wait_time(tokens, time.monotonic())
+                if wait == 0:
+                    break
+                self._condition.wait(timeout=wait)
+            for bucket, amount in self._costs(tokens):
+                bucket.take(amount)
+            self.in_flight += 1
+            self.requests += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def on_success(self, headers=None, used_tokens=None, estimated_tokens=None):
+        """Record a successful response, with its headers and token usage."""
+        with self._condition:
+            self.concurrency = min(
+                self.max_concurrency, self.concurrency + 1 / self.concurrency
+            )
+            if (
+                self.token_bucket is not None
+                and used_tokens is not None
+                and estimated_tokens is not None
+            ):
+                # charge (or refund) the difference with the estimate
+                self.token_bucket.take(used_tokens - estimated_tokens)
+            self._update_from_headers(headers)
+            self._condition.notify_all()
+
+    def on_rate_limited(self, headers=None):
+        """Record a 429 response: halve the concurrency and pause all requests."""
+        retry_after = retry_after_seconds(headers)
+        if retry_after is None:
+            retry_after = DEFAULT_RETRY_AFTER
+        with self._condition:
+            self.rate_limited += 1
+            self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+            self._blocked_until = max(
+                self._blocked_until, time.monotonic() + retry_after
+            )
+            self._update_from_headers(headers)
+        logger.warning(
+            f"Rate limited, pausing requests for {retry_after:.1f}s and lowering "
+            f"the concurrency to {int(self.concurrency)}."
+        )
+        return retry_after
+
+    def _update_from_headers(self, headers):
+        if not headers:
+            return
+        now = time.monotonic()
+        for kind, attribute in (
+            ("requests", "request_bucket"),
+            ("tokens", "token_bucket"),
+        ):
+            try:
+                limit = int(headers[f"x-ratelimit-limit-{kind}"])
+                remaining = int(headers[f"x-ratelimit-remaining-{kind}"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            bucket = getattr(self, attribute)
+            if bucket is None:
+                bucket = _TokenBucket(limit, configured=False)
+                setattr(self, attribute, bucket)
+            bucket.sync(limit, remaining, now)
@@ -0,0 +1,85 @@
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    CLEANED = "cleaned"  # the conversation was cleaned and anonymized
+    PROMPTED = "prompted"  # the LLM returned a response
+    PARSED = "parsed"  # the response was parsed into a Contact
+    WRITTEN = "written"  # the contact was saved to the output workbook
+    FAILED = "failed"
+
+
+class RunManifest:
+    """Append-only JSONL journal of the processing state of every m13id in a run.
+
+    Each line records one state change. When an existing manifest is opened the
+    lines are replayed, so that a restarted run can skip the m13ids that were
+    already written and retry the rest.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.states = {}  # m13id -> latest state
+        self._lock = threading.Lock()
+        self._load()
+        self._file = open(path, "a")
+        if self._incomplete_line:
+            # start the next entry on a new line
+            self._file.write("\n")
+            self._file.flush()
+
+    def _load(self):
+        self._incomplete_line = False
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line_number, line in enumerate(f, start=1):
+                self._incomplete_line = not line.endswith("\n")
+                try:
+                    entry = json.loads(line)
+                except json.decoder.JSONDecodeError:
+                    # a crash while appending can leave the last line incomplete
+                    logger.warning(
+                        f"Ignoring malformed line {line_number} of {self.path}"
+                    )
+                    continue
+                self.states[entry["m13id"]] = entry["state"]
+        logger.info(
+            f"Loaded {len(self.states)} entries from {self.path}, "
+            f"{len(self.written_ids())} already written."
+        )
+
+    def record(self, m13id, state, error=None):
+        """Append a state change of the m13id to the journal."""
+        entry = {"m13id": m13id, "state": state, "time": time.time()}
+        if error is not None:
+            entry["error"] = str(error)
+        with self._lock:
+            self.states[m13id] = state
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def is_written(self, m13id):
+        return self.states.get(m13id) == Stage.WRITTEN
+
+    def written_ids(self):
+        return [m13id for m13id, state in self.states.items() if state == Stage.WRITTEN]
+
+    def failed_ids(self):
+        return [m13id for m13id, state in self.states.items() if state == Stage.FAILED]
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "llm_summarization"
+
+
+def _percentile(sorted_values, fraction):
+    # linear interpolation between the closest ranks
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (
+        position - lower
+    )
+
+
+class StageTimer:
+    """Thread-safe timings of the pipeline stages, plus counters.
+
+    Every `with timer.time("stage"):` block records one wall-clock duration and
+    the CPU time of the calling thread for the stage, and `timer.count("name", n)`
+    adds to a counter such as the tokens sent. The summary gives the count,
+    total, p50, p95 and max of the durations and the total CPU time of every
+    stage, in the order the stages were first seen.
+    """
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self.cpu_times = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.durations.clear()
+            self.cpu_times.clear()
+            self.counters.clear()
+            self.started = time.monotonic()
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            self.record(
+                stage,
+                time.perf_counter() - start,
+                cpu_seconds=time.thread_time() - start_cpu,
+            )
+
+    def record(self, stage, seconds, cpu_seconds=0.0):
+        with self._lock:
+            self.durations[stage].append(seconds)
+            self.cpu_times[stage] += cpu_seconds
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def snapshot(self):
+        """The recorded durations, CPU times and counters, to merge into another timer
+        (e.g. of the parent of a worker process)."""
+        with self._lock:
+            return {
+                "durations": {
+                    stage: list(values) for stage, values in self.durations.items()
+                },
+                "cpu_times": dict(self.cpu_times),
+                "counters": dict(self.counters),
+            }
+
+    def merge(self, snapshot):
+        with self._lock:
+            for stage, values in snapshot["durations"].items():
+                self.durations[stage].extend(values)
+            for stage, cpu_seconds in snapshot["cpu_times"].items():
+                self.cpu_times[stage] += cpu_seconds
+            for name, amount in snapshot["counters"].items():
+                self.counters[name] += amount
+
+    def summary(self):
+        """Return {stage: {count, total, p50, p95, max, cpu}} of the recorded stages."""
+        with self._lock:
+            durations = {
+                stage: sorted(values) for stage, values in self.durations.items()
+            }
+            cpu_times = dict(self.cpu_times)
+        return {
+            stage: {
+                "count": len(values),
+                "total": sum(values),
+                "p50": _percentile(values, 0.5),
+                "p95": _percentile(values, 0.95),
+                "max": values[-1] if values else 0.0,
+                "cpu": cpu_times.get(stage, 0.0),
+            }
+            for stage, values in durations.items()
+        }
+
+    def format_table(self):
+        """Format the summary and the counters as a plain text table."""
+        lines = [
+            f"{'stage':<16} {'count':>7} {'total s':>10} {'p50 ms':>10} "
+            f"{'p95 ms':>10} {'max ms':>10} {'cpu s':>10}"
+        ]
+        for stage, stats in self.summary().items():
+            lines.append(
+                f"{stage:<16} {stats['count']:>7} {stats['total']:>10.3f} "
+                f"{stats['p50'] * 1000:>10.1f} {stats['p95'] * 1000:>10.1f} "
+                f"{stats['max'] * 1000:>10.1f} {stats['cpu']:>10.3f}"
+            )
+        with self._lock:
+            counters = dict(self.counters)
+        for name, value in counters.items():
+            lines.append(f"{name:<16} {value:>7}")
+        lines.append(f"{'wall time s':<16} {time.monotonic() - self.started:>18.3f}")
+        return "\n".join(lines)
+
+    def write_json(self, path):
+        with self._lock:
+            counters = dict(self.counters)
+        data = {
+            "wall_time": time.monotonic() - self.started,
+            "stages": self.summary(),
+            "counters": counters,
+        }
+        self._write_atomic(path, json.dumps(data, indent=2) + "\n")
+
+    def write_prometheus(self, path):
+        """Write the metrics in the Prometheus text format, e.g. for the
+        textfile collector of the node exporter."""
+        summary = self.summary()
+        metric = f"{METRIC_PREFIX}_stage_seconds"
+        lines = [
+            f"# HELP {metric} Duration of the pipeline stages.",
+            f"# TYPE {metric} summary",
+        ]
+        for stage, stats in summary.items():
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95")):
+                lines.append(
+                    f'{metric}{{stage="{stage}",quantile="{quantile}"}} {stats[key]}'
+                )
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {stats["total"]}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {stats["count"]}')
+        lines.append(f"# TYPE {METRIC_PREFIX}_stage_max_seconds gauge")
+        for stage, stats in summary.items():
+            lines.append(
+                f'{METRIC_PREFIX}_stage_max_seconds{{stage="{stage}"}} {stats["max"]}'
+            )
+        lines.append(f"# TYPE {METRIC_PREFIX}_stage_cpu_seconds_total counter")
+        for stage, stats in summary.items():
+            lines.append(
+                f'{METRIC_PREFIX}_stage_cpu_seconds_total{{stage="{stage}"}} {stats["cpu"]}'
+            )
+        with self._lock:
+            counters = dict(self.counters)
+        for name, value in counters.items():
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+            lines.append(f"{METRIC_PREFIX}_{name}_total {value}")
+        self._write_atomic(path, "\n".join(lines) + "\n")
+
+    @staticmethod
+    def _write_atomic(path, content):
+        # the textfile collector may read the file at any time
+        temp_file = f"{path}.tmp"
+        with open(temp_file, "w") as f:
+            f.write(content)
+        os.replace(temp_file, path)
+        logger.info(f"Wrote the stage metrics to {path}")
@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+from addressresolver import AddressResolver, process_name
+from gazetteer import ADMIN1, ADMIN2, ADMIN3, ADMIN4, Gazetteer
+
+
+@pytest.fixture(scope="module")
+def resolver():
+    # two similar kecamatan in two cities of two provinces
+    rows = [
+        ("Jawa Barat", "Bogor", "Sukamaju", "Cibeureum"),
+        ("Jawa Barat", "Kota Bogor", "Bogor Tengah", "Paledang"),
+        ("Jawa Timur", "Banyuwangi", "Sukamaja", "Kalipuro"),
+        ("Jawa Timur", "Banyuwangi", "Genteng", "Kaligondo"),
+    ]
+    return AddressResolver(
+        Gazetteer(pd.DataFrame(rows, columns=[ADMIN1, ADMIN2, ADMIN3, ADMIN4]))
+    )
+
+
+@pytest.mark.parametrize(
+    "name, processed",
+    [
+        ("Kab. Banyuwangi", "banyuwangi"),
+        ("KABUPATEN  Bogor", "bogor"),
+        ("Kota Bogor", "kota bogor"),
+        ("Kec.Genteng", "genteng"),
+        ("  Bogor-Tengah ", "bogor tengah"),
+    ],
+)
+def test_process_name(name, processed):
+    assert process_name(name) == processed
+
+
+@pytest.mark.parametrize(
+    "name, level, resolved",
+    [
+        ("Kab. Banyuwangi", ADMIN2, "Banyuwangi"),
+        ("kota bogor", ADMIN2, "Kota Bogor"),
+        ("Banyuwang", ADMIN2, "Banyuwangi"),
+        ("Gentng", ADMIN3, "Genteng"),
+        ("Bogor Tengh", ADMIN3, "Bogor Tengah"),
+        ("Jawa Timr", ADMIN1, "Jawa Timur"),
+        ("Kalipuro", ADMIN3, None),  # a desa, not a kecamatan
+        ("Surabaya", ADMIN2, None),
+        ("", ADMIN2, None),
+    ],
+)
+def test_resolve(resolver, name, level, resolved):
+    assert resolver.resolve(name, level) == resolved
+
+
+def test_resolve_searches_the_scope_first(resolver):
+    # as close to Sukamaju as to Sukamaja
+    assert resolver.resolve("Sukamajo", ADMIN3) == "Sukamaju"
+    assert resolver.resolve("Sukamajo", ADMIN3, {ADMIN2: "Banyuwangi"}) == "Sukamaja"
+    # a city that is not found leaves the province as the scope
+    scope = {ADMIN1: "Jawa Timur", ADMIN2: "Surabaya"}
+    assert resolver.resolve("Sukamajo", ADMIN3, scope) == "Sukamaja"
+    # a close name in the scope wins over an exact name outside of it
+    assert resolver.resolve("Sukamaju", ADMIN3, {ADMIN2: "Banyuwangi"}) == "Sukamaja"
+    # nothing close in the scope
+    assert resolver.resolve("Bogor Tengh", ADMIN3, {ADMIN2: "Banyuwangi"}) == (
+        "Bogor Tengah"
+    )
+
+
+def test_resolve_many_matches_resolve(resolver):
+    names = ["Sukamajo", "Gentng", "Sukamajo", None, "Surabaya", "Kec. Genteng"]
+    scopes = [{ADMIN2: "Banyuwangi"}, None, {}, None, None, {ADMIN1: "Jawa Barat"}]
+    assert resolver.resolve_many(names, ADMIN3, scopes) == [
+        resolver.resolve(name, ADMIN3, scope) for name, scope in zip(names, scopes)
+    ]
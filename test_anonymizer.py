@@ -0,0 +1,86 @@
+import random
+import re
+import pytest
+from anonymizer import Anonymizer, NAME_PLACEHOLDER, PHONE_PLACEHOLDER
+
+
+# The regex implementation of main.anonymize that Anonymizer replaced, the
+# reference for its output
+def regex_anonymize(conversation, original_name):
+    original_name = original_name.replace("(", "").replace(")", "")
+    name_parts = original_name.split()
+    name_pattern = (
+        r"\b("
+        + r"|".join(
+            [re.escape(part) for part in name_parts]
+            + [r"\s+".join(map(re.escape, name_parts))]
+        )
+        + r")\b"
+    )
+    name_with_parentheses_pattern = (
+        r"(" + r"\s+".join(map(re.escape, name_parts)) + r")\s*\(([^)]+)\)"
+    )
+    conversation = re.compile(name_pattern, re.IGNORECASE).sub(
+        NAME_PLACEHOLDER, conversation
+    )
+    conversation = re.compile(name_with_parentheses_pattern, re.IGNORECASE).sub(
+        lambda match: f"{NAME_PLACEHOLDER} ({NAME_PLACEHOLDER})", conversation
+    )
+
+    phone_regex = re.compile(r"(?<!\d)(?:\+62|08)\d{9,}\b")
+    original_phone_numbers = phone_regex.findall(conversation)
+    conversation = phone_regex.sub(PHONE_PLACEHOLDER, conversation)
+    return conversation, original_phone_numbers
+
+
+def anonymize(conversation, name):
+    name = name.replace("(", "").replace(")", "")
+    return Anonymizer().anonymize(conversation, [name])
+
+
+@pytest.mark.parametrize(
+    "name, conversation",
+    [
+        ("Budi Santoso", "Halo, saya Budi Santoso. Panggil saja budi ya"),
+        ("Budi Santoso", "BUDI: nomor saya 081234567890 atau +6281234567890"),
+        ("Budi Santoso", "Budiman bukan Budi, 0812345678 terlalu pendek"),
+        ("An Anna", "an, anna dan annabelle"),
+        # a part that is a prefix of another part ending in punctuation
+        ("a a.", "A._"),
+        ("A a.", "a.anannab."),
+        ("Budi S.", "Budi S. (Santoso) dan S.Budi"),
+        ("S.", "S. S.(x) S.s"),
+        ("x.y z", "x.y z x.yz"),
+        ("Élo", "élo ÉLO Éloise"),
+        ("a_x", "a_x_a a_x"),
+        ("Budi Budi", "budi budi"),
+        ("Budi (Santoso)", "Budi Santoso (Santoso) 08123456789012"),
+        ("Budi", "08123456789012Budi 081234567890123 +62812345678901x"),
+    ],
+)
+def test_anonymize_matches_the_regex_implementation(name, conversation):
+    assert anonymize(conversation, name) == regex_anonymize(conversation, name)
+
+
+def test_anonymize_matches_the_regex_implementation_on_random_text():
+    pieces = ["a", "A", "a.", "A.", "b.", "an", "anna", "Budi", "budi", "S."]
+    pieces += [".", "_", "-", " ", "  ", "\n", "(", ")", "x", "é", "É"]
+    pieces += ["08123456789012", "+6281234567890", "0812345"]
+    rng = random.Random(0)
+    for _ in range(20000):
+        name = " ".join(rng.choice(pieces[:10]) for _ in range(rng.randint(1, 3)))
+        if rng.random() < 0.1:
+            name += f" ({rng.choice(pieces[:10])})"
+        conversation = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 12)))
+        assert anonymize(conversation, name) == regex_anonymize(conversation, name), (
+            name,
+            conversation,
+        )
+
+
+def test_anonymize_returns_the_original_phone_numbers():
+    conversation, phone_numbers = anonymize(
+        "wa 081234567890, telp +6281234567891", "Budi"
+    )
+    assert conversation == f"wa {PHONE_PLACEHOLDER}, telp {PHONE_PLACEHOLDER}"
+    assert phone_numbers == ["081234567890", "+6281234567891"]
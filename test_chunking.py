@@ -0,0 +1,122 @@
+import threading
+import time
+import pytest
+import chunking
+from chunking import (
+    count_tokens,
+    merge_extractions,
+    parse_confidence,
+    split_into_chunks,
+)
+
+MODEL = "gpt-4o-mini"
+
+
+@pytest.mark.parametrize(
+    "confidence, expected",
+    [
+        ("90%", 0.9),
+        ("0.9", 0.9),
+        ("85", 0.85),
+        ("95,5%", 0.955),
+        ("150%", 1.0),
+        ("Tinggi", 0.8),
+        ("sangat tinggi", 0.95),
+        ("", 0.0),
+        (None, 0.0),
+    ],
+)
+def test_parse_confidence(confidence, expected):
+    assert parse_confidence(confidence) == pytest.approx(expected)
+
+
+def test_encoding_is_loaded_once_by_concurrent_threads(monkeypatch):
+    loads = []
+
+    def slow_load(model):
+        loads.append(model)
+        time.sleep(0.1)  # like the download of the encoding file
+        return None
+
+    monkeypatch.setattr(chunking, "_encodings", {})
+    monkeypatch.setattr(chunking, "_load_encoding", slow_load)
+    threads = [
+        threading.Thread(target=count_tokens, args=("halo", MODEL)) for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == [MODEL]
+
+
+def test_split_into_chunks_keeps_lines_whole():
+    lines = [f"Budi: pesan nomor {index} tentang Isa Al-Masih\n" for index in range(50)]
+    text = "".join(lines)
+    chunks = split_into_chunks(text, 60, MODEL)
+    assert len(chunks) > 1
+    assert "".join(chunks) == text
+    for chunk in chunks:
+        assert count_tokens(chunk, MODEL) <= 60
+        assert chunk.endswith("\n")
+
+
+def test_split_into_chunks_splits_a_long_line():
+    text = "kata " * 500
+    chunks = split_into_chunks(text, 50, MODEL)
+    assert len(chunks) > 1
+    assert "".join(chunks) == text
+    assert all(count_tokens(chunk, MODEL) <= 50 for chunk in chunks)
+
+
+def test_merge_extractions():
+    partials = [
+        {
+            "age_result": "30",
+            "age_reasoning": "part 1",
+            "age_confidence": "60%",
+            "gender_result": "",
+            "gender_reasoning": "",
+            "gender_confidence": "",
+            "persona_initial_problem": "gelisah",
+            "persona_pressing_problem": "pekerjaan",
+            "comments": "COD asked about IAM.",
+            "summary_paragraph": "Bagian pertama.",
+        },
+        {
+            "age_result": "32",
+            "age_reasoning": "part 2",
+            "age_confidence": "90%",
+            "gender_result": "Laki-laki",
+            "gender_reasoning": "part 2",
+            "gender_confidence": "tinggi",
+            "persona_initial_problem": "",
+            "persona_pressing_problem": "keluarga",
+            "comments": "COD asked about IAM.",
+            "summary_paragraph": "Bagian kedua.",
+        },
+        {
+            "age_result": "31",
+            "age_reasoning": "part 3",
+            "age_confidence": "90%",
+            "gender_result": "",
+            "persona_initial_problem": "sakit",
+            "persona_pressing_problem": "",
+            "comments": "COD wants to meet.",
+        },
+    ]
+    assert merge_extractions(partials) == {
+        # the highest confidence, the latest part on a tie
+        "age_result": "31",
+        "age_reasoning": "part 3",
+        "age_confidence": "90%",
+        "gender_result": "Laki-laki",
+        "gender_reasoning": "part 2",
+        "gender_confidence": "tinggi",
+        # the first initial and the last pressing problem
+        "persona_initial_problem": "gelisah",
+        "persona_pressing_problem": "keluarga",
+        # the distinct texts of all the parts
+        "comments": "COD asked about IAM. COD wants to meet.",
+        "summary_paragraph": "Bagian pertama. Bagian kedua.",
+    }
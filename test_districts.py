@@ -0,0 +1,68 @@
+import os
+import pandas as pd
+import pytest
+from benchmark import REPO_DIR
+from districts import DISTRICTS_FILE, KABUPATEN, KOTA, DistrictIndex
+
+
+@pytest.fixture(scope="module")
+def districts_df():
+    return pd.read_csv(os.path.join(REPO_DIR, DISTRICTS_FILE))
+
+
+@pytest.fixture(scope="module")
+def index(districts_df):
+    return DistrictIndex(districts_df)
+
+
+# Contact._find_level before the index, which scanned the file for every name
+def scan_find_level(df, name):
+    if name.lower().split()[0] == "kota":
+        return KOTA
+    words = df["name"].str.upper().str.split()
+    names = words.apply(lambda x: " ".join(x[1:]))
+    match_index = names.str.lower() == name.lower()
+    if match_index.any():
+        return words[match_index.idxmax()][0]
+    return None
+
+
+def test_find_level_matches_the_scan_of_the_file(districts_df, index):
+    names = []
+    for name in districts_df["name"]:
+        district = name.partition(" ")[2]
+        names += [district, district.title(), district.lower()]
+    # the scan only knew the prefix "kota", see test_find_level for the others
+    names += ["Kota Bogor", "Kota Nowhere", "Nowhere"]
+    for name in names:
+        assert index.find_level(name) == scan_find_level(districts_df, name), name
+
+
+@pytest.mark.parametrize(
+    "name, level",
+    [
+        ("Bogor", KABUPATEN),  # the first district of that name
+        ("Kota Bogor", KOTA),
+        ("Kabupaten Bogor", KABUPATEN),
+        ("Kab. Bogor", KABUPATEN),
+        ("  bogor ", KABUPATEN),
+        ("Toli Toli", KABUPATEN),
+        ("Kep. Seribu", KABUPATEN),
+        ("Jaksel", KOTA),
+        ("Nowhere", None),
+        ("", None),
+        (None, None),
+    ],
+)
+def test_find_level(index, name, level):
+    assert index.find_level(name) == level
+
+
+def test_find_levels_matches_find_level(districts_df, index):
+    names = pd.Series(
+        [name.partition(" ")[2].title() for name in districts_df["name"]]
+        + ["Kota Bogor", "Kab. Bogor", "Kep. Seribu", "Jaksel", "Nowhere"]
+    )
+    assert index.find_levels(names).tolist() == [
+        index.find_level(name) for name in names
+    ]
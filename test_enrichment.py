@@ -0,0 +1,68 @@
+import copy
+import random
+import utility
+from contact import Contact
+from enrichment import enrich_contacts
+from gazetteer import ADMIN1, ADMIN2, ADMIN3, ADMIN4
+
+
+def random_contacts(gazetteer, count, seed=0):
+    """Contacts with a kecamatan that is a kecamatan, desa, city or province of
+    the gazetteer, exactly or misspelled, or no known name at all."""
+    rng = random.Random(seed)
+    df = gazetteer.df
+
+    def typo(name):
+        position = rng.randrange(len(name))
+        return name[:position] + name[position + 1 :]
+
+    contacts = []
+    for _ in range(count):
+        row = df.iloc[rng.randrange(len(df))]
+        kecamatan = rng.choice(
+            [
+                row[ADMIN3],
+                row[ADMIN3].upper(),
+                typo(row[ADMIN3]),
+                "Kec. " + row[ADMIN3],
+                row[ADMIN4],
+                typo(row[ADMIN4]),
+                row[ADMIN2],
+                typo(row[ADMIN2]),
+                row[ADMIN1],
+                "Nowhere at all",
+                "",
+                None,
+            ]
+        )
+        contacts.append(
+            Contact(
+                id=f"A {len(contacts):04d}",
+                name="Budi",
+                province=rng.choice([row[ADMIN1], ""]),
+                city=rng.choice([row[ADMIN2], typo(row[ADMIN2]), ""]),
+                kecamatan=kecamatan,
+            )
+        )
+    return contacts
+
+
+def test_enrich_contacts_matches_init_level(address_db):
+    contacts = random_contacts(address_db, 600)
+    expected_contacts = [copy.copy(contact) for contact in contacts]
+    for contact in expected_contacts:
+        contact.init_level()
+    expected = [utility.contact_to_row(contact) for contact in expected_contacts]
+
+    assert enrich_contacts(contacts) == expected
+    assert contacts == expected_contacts
+    assert [contact.level for contact in contacts] == [
+        contact.level for contact in expected_contacts
+    ]
+
+
+def test_enrich_contacts_resolves_a_misspelled_kecamatan(address_db):
+    contact = Contact(city="Bogor", kecamatan="Bogr Kecamatan 1")
+    enrich_contacts([contact])
+    assert contact.kecamatan == "Bogor Kecamatan 1"
+    assert contact.level == "KABUPATEN"
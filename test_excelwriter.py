@@ -0,0 +1,51 @@
+import openpyxl
+import pytest
+from excelwriter import ExcelWriter
+
+HEADERS = ["M13 ID", "Name"]
+
+
+def read_rows(file_name):
+    workbook = openpyxl.load_workbook(file_name)
+    rows = [list(row) for row in workbook.active.iter_rows(values_only=True)]
+    workbook.close()
+    return rows
+
+
+def test_rows_are_saved_in_batches(tmp_path):
+    file_name = str(tmp_path / "output.xlsx")
+    saved = []
+    with ExcelWriter(file_name, HEADERS, batch_size=3, on_flush=saved.append) as writer:
+        for index in range(4):
+            writer.append([f"A {index}", "Budi"], key=f"A {index}")
+        # the headers and the first two rows
+        assert read_rows(file_name) == [HEADERS, ["A 0", "Budi"], ["A 1", "Budi"]]
+    assert saved == [["A 0", "A 1"], ["A 2", "A 3"]]
+    assert len(read_rows(file_name)) == 5
+
+
+def test_batch_size_none_saves_on_close_only(tmp_path):
+    file_name = str(tmp_path / "output.xlsx")
+    with ExcelWriter(file_name, HEADERS, batch_size=None) as writer:
+        for index in range(100):
+            writer.append([f"A {index}", "Budi"])
+        assert not (tmp_path / "output.xlsx").exists()
+    assert len(read_rows(file_name)) == 101
+
+
+def test_rows_are_appended_to_an_existing_workbook(tmp_path):
+    file_name = str(tmp_path / "output.xlsx")
+    with ExcelWriter(file_name, HEADERS) as writer:
+        writer.append(["A 0", "Budi"])
+    with ExcelWriter(file_name, HEADERS, check_headers=True) as writer:
+        writer.append(["A 1", "Budi"])
+    assert read_rows(file_name) == [HEADERS, ["A 0", "Budi"], ["A 1", "Budi"]]
+
+
+def test_check_headers_refuses_other_headers(tmp_path):
+    file_name = str(tmp_path / "output.xlsx")
+    with ExcelWriter(file_name, HEADERS) as writer:
+        writer.append(["A 0", "Budi"])
+    with pytest.raises(ValueError, match="headers"):
+        with ExcelWriter(file_name, HEADERS + ["Summary"], check_headers=True):
+            pass
@@ -0,0 +1,104 @@
+import random
+import warnings
+import pytest
+from bs4 import BeautifulSoup
+from benchmark_html import synthetic_samples
+from htmltext import html_to_text
+
+PIECES = [
+    "<p>",
+    "</p>",
+    "<br>",
+    "</br>",
+    "<br/>",
+    "<b>",
+    "</b>",
+    "<pre>",
+    "</pre>",
+    "<textarea>",
+    "</textarea>",
+    "<script>",
+    "</script>",
+    "<style>",
+    "</style>",
+    "<template>",
+    "</template>",
+    "<rt>",
+    "</rt>",
+    "<!-- c -->",
+    "<!DOCTYPE html>",
+    "<![CDATA[ x ]]>",
+    "<?pi x?>",
+    "&amp;",
+    "&nbsp;",
+    "&#65;",
+    "&#x41;",
+    "&#0;",
+    "&#;",
+    "&#12ab",
+    "&#xzz;",
+    "&foo",
+    "&foo;",
+    "&amp",
+    "&",
+    "<",
+    ">",
+    " ",
+    "  ",
+    "\n",
+    "\t",
+    "\r\n",
+    "halo",
+    "<div class='a'>",
+    "</div>",
+    "<img src=x>",
+    "</img>",
+    '<a href="x">',
+    "</a>",
+    "</",
+    "<!",
+    "é",
+    "&#150;",
+    "&lt;",
+    "</ p>",
+    "<p/>",
+    "< p>",
+]
+
+
+def soup_text(markup):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return BeautifulSoup(markup, "html.parser").get_text()
+
+
+@pytest.mark.parametrize(
+    "markup",
+    [
+        "",
+        "   ",
+        "\n \n",
+        "plain text, no markup",
+        "<p>Halo <b>kak</b></p>\n<p>nomor saya 081234567890</p>",
+        "<p>a</p>   <p>b</p>\n\n<p>c</p>",
+        "<pre>  kept\n  as is  </pre><p>  </p>",
+        "<script>var x = 1;</script><style>p {}</style>text",
+        "A &amp; B &lt;3 &nbsp;&#65;&#x42;&#12ab &foo; &foo",
+        "<!-- comment --><![CDATA[ cdata ]]><?pi x?><!DOCTYPE html>end",
+        "<br>a</br>b<br/>c<img src=x>d</img>",
+    ],
+)
+def test_html_to_text_matches_beautifulsoup(markup):
+    assert html_to_text(markup) == soup_text(markup)
+
+
+def test_html_to_text_matches_beautifulsoup_on_conversations():
+    for sample in synthetic_samples(20, 30, seed=0):
+        assert html_to_text(sample) == soup_text(sample)
+
+
+def test_html_to_text_matches_beautifulsoup_on_random_markup():
+    rng = random.Random(0)
+    for _ in range(5000):
+        markup = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 20)))
+        assert html_to_text(markup) == soup_text(markup), markup
@@ -0,0 +1,109 @@
+import os
+from types import SimpleNamespace
+import pytest
+import llmcache
+from llmcache import CacheMode, LLMCache
+
+DAY = 86400
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace the time of llmcache by a clock that only moves when told to."""
+    clock = SimpleNamespace(now=1_000_000.0)
+    monkeypatch.setattr(llmcache, "time", SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cache.sqlite")
+
+
+def test_make_key():
+    key = LLMCache.make_key("gpt-4o-mini", "v1", "halo")
+    assert key == LLMCache.make_key("gpt-4o-mini", "v1", "halo")
+    assert key != LLMCache.make_key("gpt-4o", "v1", "halo")
+    assert key != LLMCache.make_key("gpt-4o-mini", "v2", "halo")
+    assert key != LLMCache.make_key("gpt-4o-mini", "v1", "halo!")
+    # the parts are separated, not just concatenated
+    assert LLMCache.make_key("a", "bc", "") != LLMCache.make_key("ab", "c", "")
+
+
+def test_use_reads_and_writes_the_cache(path):
+    cache = LLMCache(path)
+    assert cache.get("key") is None
+    cache.set("key", "response")
+    cache.set("none", None)  # failed requests are not cached
+    assert cache.get("key") == "response"
+    assert cache.get("none") is None
+    cache.close()
+
+    cache = LLMCache(path)
+    assert cache.get("key") == "response"
+    cache.close()
+
+
+def test_refresh_ignores_the_cache_but_stores_the_responses(path):
+    cache = LLMCache(path)
+    cache.set("key", "old")
+    cache.close()
+
+    cache = LLMCache(path, mode=CacheMode.REFRESH)
+    assert cache.get("key") is None
+    cache.set("key", "new")
+    cache.close()
+
+    cache = LLMCache(path)
+    assert cache.get("key") == "new"
+    cache.close()
+
+
+def test_bypass_does_not_touch_the_cache(path):
+    cache = LLMCache(path, mode=CacheMode.BYPASS)
+    cache.set("key", "response")
+    assert cache.get("key") is None
+    cache.evict()
+    cache.close()
+    assert not os.path.exists(path)
+
+
+def test_invalid_mode(path):
+    with pytest.raises(ValueError):
+        LLMCache(path, mode="sometimes")
+
+
+def test_entries_expire_after_max_age_days(path, clock):
+    cache = LLMCache(path, max_age_days=30)
+    cache.set("old", "response")
+    clock.now += 20 * DAY
+    cache.set("new", "response")
+    clock.now += 11 * DAY
+    assert cache.get("old") is None
+    assert cache.get("new") == "response"
+    cache.close()
+
+    # opening the cache deletes the expired entries
+    cache = LLMCache(path, max_age_days=None)
+    assert cache.get("old") == "response"
+    cache.close()
+    cache = LLMCache(path, max_age_days=30)
+    cache.close()
+    cache = LLMCache(path, max_age_days=None)
+    assert cache.get("old") is None
+    assert cache.get("new") == "response"
+    cache.close()
+
+
+def test_evict_keeps_the_most_recently_used_entries(path, clock):
+    cache = LLMCache(path, max_entries=2)
+    for key in ("a", "b", "c"):
+        clock.now += 1
+        cache.set(key, key)
+    clock.now += 1
+    assert cache.get("a") == "a"
+    cache.evict()
+    assert cache.get("a") == "a"
+    assert cache.get("b") is None
+    assert cache.get("c") == "c"
+    cache.close()
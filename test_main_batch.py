@@ -0,0 +1,96 @@
+import os
+import pytest
+import batchrunner
+import benchmark
+import main
+import utility
+from conftest import FILES, read_rows
+from extraction import SummaryMode
+from runmanifest import RunManifest
+
+
+@pytest.mark.parametrize(
+    "summary_mode", [SummaryMode.OFF, SummaryMode.SEPARATE, SummaryMode.COMBINED]
+)
+def test_main_batch_writes_the_rows_of_main(run, monkeypatch, summary_mode):
+    folder_path, m13ids, client = run
+    monkeypatch.setattr(main, "summary_mode", summary_mode)
+
+    main.main(folder_path, "direct.xlsx")
+    direct_requests = client.requests
+    monkeypatch.setattr(main, "llm_cache", None)
+    client.requests = 0
+    main.main_batch(folder_path, "batch.xlsx", poll_interval=0, client=client)
+
+    assert client.requests == direct_requests
+    rows = read_rows("batch.xlsx")
+    assert rows == read_rows("direct.xlsx")
+    assert rows[0] == main._excel_headers()
+    assert [row[0] for row in rows[1:]] == m13ids
+    assert rows[1][1] == benchmark.CONTACT_NAME
+    if summary_mode != SummaryMode.OFF:
+        assert all(row[-1] not in (None, "", "None") for row in rows[1:])
+    assert not os.path.exists("batch.batches.json")
+    with RunManifest("batch.manifest.jsonl") as manifest:
+        assert manifest.written_ids() == m13ids
+
+
+def test_main_batch_resumes_the_submitted_batches(run, monkeypatch):
+    folder_path, m13ids, client = run
+    client.batch_polls = 1
+    retrieve = client.batches.retrieve
+
+    def stop(batch_id):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(client.batches, "retrieve", stop)
+    with pytest.raises(KeyboardInterrupt):
+        main.main_batch(folder_path, "batch.xlsx", poll_interval=0, client=client)
+    assert os.path.exists("batch.batches.json")
+    assert client.requests == FILES
+
+    # the restarted run polls the same batch instead of submitting it again
+    monkeypatch.setattr(client.batches, "retrieve", retrieve)
+    main.main_batch(folder_path, "batch.xlsx", poll_interval=0, client=client)
+    assert client.requests == FILES
+    assert len(read_rows("batch.xlsx")) == FILES + 1
+    assert not os.path.exists("batch.batches.json")
+
+
+def test_main_batch_keeps_the_results_of_the_other_batches(run, monkeypatch):
+    folder_path, m13ids, client = run
+    monkeypatch.setattr(batchrunner, "MAX_BATCH_REQUESTS", 2)
+    client.failed_batches = {"batch-2"}
+
+    main.main_batch(folder_path, "batch.xlsx", poll_interval=0, client=client)
+    assert [row[0] for row in read_rows("batch.xlsx")[1:]] == m13ids[:2] + m13ids[4:]
+    with RunManifest("batch.manifest.jsonl") as manifest:
+        assert manifest.failed_ids() == m13ids[2:4]
+    assert not os.path.exists("batch.batches.json")
+
+    # only the requests of the failed batch are sent again, the others are cached
+    client.failed_batches = set()
+    client.requests = 0
+    main.main_batch(folder_path, "batch.xlsx", poll_interval=0, client=client)
+    assert client.requests == 2
+    assert len(read_rows("batch.xlsx")) == FILES + 1
+
+
+@pytest.mark.parametrize("batch", [False, True])
+def test_resuming_with_another_summary_mode_fails_before_sending(
+    run, monkeypatch, batch
+):
+    folder_path, m13ids, client = run
+    main.main(folder_path, "output.xlsx")
+    os.remove("output.manifest.jsonl")  # as if the run was interrupted
+    monkeypatch.setattr(main, "summary_mode", SummaryMode.COMBINED)
+    monkeypatch.setattr(main, "llm_cache", None)
+    client.requests = 0
+
+    with pytest.raises(ValueError, match="headers"):
+        if batch:
+            main.main_batch(folder_path, "output.xlsx", poll_interval=0, client=client)
+        else:
+            main.main(folder_path, "output.xlsx")
+    assert client.requests == 0
+    assert len(read_rows("output.xlsx")[0]) == len(utility.EXCEL_HEADERS)
@@ -0,0 +1,54 @@
+import benchmark
+import main
+from anonymizer import NAME_PLACEHOLDER
+from conftest import read_rows
+
+
+def record_prompts(client, monkeypatch):
+    """Keep the prompts the client receives."""
+    prompts = []
+    create = client.create
+
+    def recording_create(model, messages, **kwargs):
+        prompts.append("".join(message["content"] for message in messages))
+        return create(model, messages, **kwargs)
+
+    monkeypatch.setattr(client.chat.completions, "create", recording_create)
+    return prompts
+
+
+def test_names_missing_from_the_prefetch_are_looked_up_per_file(run, monkeypatch):
+    folder_path, m13ids, client = run
+    prompts = record_prompts(client, monkeypatch)
+    # as if the query of the chunk failed, execute_query returns no rows then
+    monkeypatch.setattr(
+        benchmark.SQLiteDatabaseManager,
+        "fetch_names_by_m13_list",
+        lambda self, m13ids, chunk_size=500: {},
+    )
+
+    main.main(folder_path, "output.xlsx")
+
+    rows = read_rows("output.xlsx")
+    assert [row[1] for row in rows[1:]] == [benchmark.CONTACT_NAME] * len(m13ids)
+    assert prompts
+    for prompt in prompts:
+        assert benchmark.CONTACT_NAME not in prompt
+        assert NAME_PLACEHOLDER in prompt
+
+
+def test_process_pool_writes_the_rows_of_the_threads(run):
+    folder_path, m13ids, client = run
+
+    main.main(folder_path, "threads.xlsx", max_workers=2, excel_batch_size=2)
+    main.main(
+        folder_path,
+        "processes.xlsx",
+        max_workers=2,
+        excel_batch_size=2,
+        process_workers=2,
+    )
+
+    rows = read_rows("processes.xlsx")
+    assert rows == read_rows("threads.xlsx")
+    assert [row[0] for row in rows[1:]] == m13ids
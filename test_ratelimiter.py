@@ -0,0 +1,103 @@
+import threading
+import time
+import pytest
+from ratelimiter import (
+    RateLimiter,
+    _TokenBucket,
+    parse_duration,
+    retry_after_seconds,
+)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("1s", 1), ("6m0s", 360), ("20ms", 0.02), ("1h2m", 3720), ("2.5", 2.5)],
+)
+def test_parse_duration(value, expected):
+    assert parse_duration(value) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize(
+    "headers, expected",
+    [
+        ({"retry-after-ms": "1500", "retry-after": "9"}, 1.5),
+        ({"retry-after": "2"}, 2),
+        (
+            {
+                "x-ratelimit-remaining-requests": "0",
+                "x-ratelimit-reset-requests": "1s",
+                "x-ratelimit-remaining-tokens": "0",
+                "x-ratelimit-reset-tokens": "6m0s",
+            },
+            360,
+        ),
+        ({"x-ratelimit-remaining-tokens": "10"}, None),
+        (None, None),
+    ],
+)
+def test_retry_after_seconds(headers, expected):
+    assert retry_after_seconds(headers) == expected
+
+
+def test_token_bucket_refills_continuously():
+    bucket = _TokenBucket(60)  # one unit per second
+    now = bucket.updated
+    assert bucket.wait_time(60, now) == 0
+    bucket.take(60)
+    assert bucket.wait_time(1, now) == pytest.approx(1)
+    assert bucket.wait_time(1, now + 1) == pytest.approx(0)
+    # a request larger than the budget waits for a full bucket
+    assert bucket.wait_time(120, now + 1) == pytest.approx(59)
+
+
+def test_concurrency_halves_when_rate_limited_and_grows_back():
+    limiter = RateLimiter(max_concurrency=8)
+    limiter.on_rate_limited({"retry-after-ms": "1"})
+    assert limiter.concurrency == 4
+    limiter.on_rate_limited({"retry-after-ms": "1"})
+    assert limiter.concurrency == 2
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.concurrency == 8
+    assert limiter.rate_limited == 2
+
+
+def test_requests_wait_for_a_slot():
+    limiter = RateLimiter(max_concurrency=2)
+    release = threading.Event()
+    acquired = []
+
+    def request(index):
+        with limiter.acquire():
+            acquired.append(index)
+            release.wait()
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    assert len(acquired) == 2 and limiter.in_flight == 2
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert len(acquired) == 3 and limiter.in_flight == 0
+
+
+def test_buckets_are_learned_from_the_headers():
+    limiter = RateLimiter(tokens_per_minute=1000)
+    with limiter.acquire(100):
+        pass
+    limiter.on_success(
+        {
+            "x-ratelimit-limit-requests": "500",
+            "x-ratelimit-remaining-requests": "499",
+            "x-ratelimit-limit-tokens": "200000",
+            "x-ratelimit-remaining-tokens": "150",
+        },
+        used_tokens=120,
+        estimated_tokens=100,
+    )
+    assert limiter.request_bucket.capacity == 500
+    # a configured budget stays an upper bound
+    assert limiter.token_bucket.capacity == 1000
+    assert limiter.token_bucket.level <= 150
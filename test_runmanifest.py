@@ -0,0 +1,40 @@
+from runmanifest import RunManifest, Stage
+
+
+def test_a_reopened_manifest_has_the_latest_states(tmp_path):
+    path = str(tmp_path / "output.manifest.jsonl")
+    with RunManifest(path) as manifest:
+        for m13id in ["A 0", "A 1", "A 2"]:
+            manifest.record(m13id, Stage.CLEANED)
+        manifest.record("A 0", Stage.WRITTEN)
+        manifest.record("A 1", Stage.FAILED, error=ValueError("Contact is None"))
+        manifest.record("A 2", Stage.PARSED)
+
+    with RunManifest(path) as manifest:
+        assert manifest.is_written("A 0")
+        assert not manifest.is_written("A 1")
+        assert manifest.written_ids() == ["A 0"]
+        assert manifest.failed_ids() == ["A 1"]
+        assert manifest.states["A 2"] == Stage.PARSED
+        # a retried m13id
+        manifest.record("A 1", Stage.WRITTEN)
+
+    with RunManifest(path) as manifest:
+        assert manifest.written_ids() == ["A 0", "A 1"]
+        assert manifest.failed_ids() == []
+
+
+def test_an_incomplete_last_line_is_ignored(tmp_path):
+    path = tmp_path / "output.manifest.jsonl"
+    with RunManifest(str(path)) as manifest:
+        manifest.record("A 0", Stage.WRITTEN)
+    with open(path, "a") as f:
+        f.write('{"m13id": "A 1", "sta')  # a crash while appending
+
+    with RunManifest(str(path)) as manifest:
+        assert manifest.written_ids() == ["A 0"]
+        assert "A 1" not in manifest.states
+        manifest.record("A 1", Stage.WRITTEN)
+
+    with RunManifest(str(path)) as manifest:
+        assert manifest.written_ids() == ["A 0", "A 1"]
@@ -4,7 +4,7 @@ import logging
 import os
 import openpyxl
 import re
-from bs4 import BeautifulSoup
+from htmltext import html_to_text, html_to_text_lxml
 from typing import List
 from rapidfuzz import process
 
@@ -34,6 +34,7 @@ def parse_json_to_contact(json_data):
             "city": data.get("address_city_result", ""),
             "kecamatan": data.get("address_kecamatan_result", ""),
             "address": data.get("address_detail_result", ""),
+            "conversation_summary": data.get("summary_paragraph", ""),
         }
         return Contact(**contact_info)
     except json.decoder.JSONDecodeError as e:
@@ -88,6 +89,30 @@ EXCEL_HEADERS = [
     "Extra Info",
     "Comments",
 ]
+# the narrative summary column, only written when a summary is requested
+SUMMARY_HEADER = "Summary"
+# the Contact field of every column of EXCEL_HEADERS
+ROW_FIELDS = [
+    "id",
+    "name",
+    "attitude",
+    "phone_number",
+    "persona",
+    "status_hp",
+    "suku",
+    "gender",
+    "province",
+    "age",
+    "level",
+    "education",
+    "city",
+    "occupation",
+    "kecamatan",
+    "marriage",
+    "address",
+    "extra_info",
+    "summary",
+]
 
 
 # returns True if success, False if contact is None
@@ -111,32 +136,17 @@ def contact_to_excel(contact, excel_file_name):
         headers = EXCEL_HEADERS
         ws.append(headers)
 
-    row_data = [
-        str(contact.id),
-        str(contact.name),
-        str(contact.attitude),
-        str(contact.phone_number),
-        str(contact.persona),
-        str(contact.status_hp),
-        str(contact.suku),
-        str(contact.gender),
-        str(contact.province),
-        str(contact.age),
-        str(contact.level),  # 'level' is now directly accessed as a property
-        str(contact.education),
-        str(contact.city),
-        str(contact.occupation),
-        str(contact.kecamatan),
-        str(contact.marriage),
-        str(contact.address),
-        str(contact.extra_info),
-        str(contact.summary),
-    ]
-    ws.append(row_data)
+    ws.append(contact_to_row(contact))
     wb.save(excel_file_name)
     return True
 
 
+# returns the values of a contact in the order of EXCEL_HEADERS
+def contact_to_row(contact):
+    # 'level' is a property, reading it initializes the level if needed
+    return [str(getattr(contact, field)) for field in ROW_FIELDS]
+
+
 # This function extracts and returns the ID in the format "<A-Z> <4 digit numbers>" from a file path
 def get_file_id(file_path):
     pattern = r"([A-Z])\s(\d{4})"
@@ -201,9 +211,13 @@ def validate_excel(filename: str):
         return filename
 
 
-def clean_html_styling(conversation_text):
-    soup = BeautifulSoup(conversation_text, "html.parser")
-    return soup.get_text()
+# Strips the HTML tags and decodes the entities, the output is the same as
+# BeautifulSoup(conversation_text, "html.parser").get_text(). The optional lxml
+# path is faster on large documents but may differ in whitespace.
+def clean_html_styling(conversation_text, use_lxml=False):
+    if use_lxml:
+        return html_to_text_lxml(conversation_text)
+    return html_to_text(conversation_text)
 
 
 def fuzzy_search(keyword: str, column: List[str]):